@@ -0,0 +1,168 @@
+""" Adaptive limit on the number of commands running at once
+
+The best number of commands to run at once depends on the command: commands
+waiting on I/O can run many at once, commands using a lot of memory should
+run few at once.  An ``AdaptiveLimit`` adjusts the number of commands from
+the observed rate of finished commands, the load average, and the available
+memory.  Pass it as ``max_workers`` to ``AppWrapper.run_many``.
+"""
+
+import os
+import threading
+from time import perf_counter
+
+
+def memory_available():
+    """ Return fraction of system memory available, or None if not known
+
+    Reads ``MemAvailable`` and ``MemTotal`` from ``/proc/meminfo``, so only
+    knows the available memory on Linux.
+    """
+    values = {}
+    try:
+        with open('/proc/meminfo', 'rt') as fobj:
+            for line in fobj:
+                key, _, value = line.partition(':')
+                if key in ('MemAvailable', 'MemTotal'):
+                    values[key] = int(value.split()[0])
+    except (IOError, OSError, ValueError):
+        return None
+    if len(values) < 2 or values['MemTotal'] == 0:
+        return None
+    return values['MemAvailable'] / values['MemTotal']
+
+
+def load_per_cpu():
+    """ Return 1 minute load average per CPU, or None if not known """
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return None
+    return load / (os.cpu_count() or 1)
+
+
+class AdaptiveLimit(object):
+    """ Number of commands to run at once, adjusted as commands finish
+
+    Every `interval` seconds, the limit changes by one step:
+
+    * if the fraction of available memory is below `min_memory`, the limit
+      drops by a quarter (at least one), to back off quickly;
+    * otherwise, if the load average per CPU is above `max_load`, the limit
+      drops by one;
+    * otherwise, if the last step increased the limit, but the rate of
+      finished commands fell, the limit drops by one, and holds for `hold`
+      intervals;
+    * otherwise, if holding, the limit stays the same;
+    * otherwise, the limit increases by one, as the CPUs have capacity.
+
+    Each time the rate falls again after the hold, the hold doubles, up to
+    16 times `hold`, so the limit settles at the best number of commands.
+    The hold goes back to `hold` when an increase does not reduce the rate,
+    or when the limit drops for memory or load.
+
+    The limit stays between `min_workers` and `max_workers`.  The load
+    average is the 1 minute average, so it lags behind changes in the limit.
+
+    Examples
+    --------
+    >>> limit = AdaptiveLimit(min_workers=1, max_workers=8, start=2)
+    >>> limit.limit
+    2
+    """
+    def __init__(self, min_workers=1, max_workers=None, start=None,
+                 max_load=1.0, min_memory=0.1, interval=1.0, hold=4):
+        """ Initialize limit
+
+        Parameters
+        ----------
+        min_workers : int, optional
+            smallest limit
+        max_workers : None or int, optional
+            largest limit.  If None, use four times the number of CPUs
+        start : None or int, optional
+            starting limit.  If None, use the number of CPUs, or
+            `max_workers` if smaller
+        max_load : float, optional
+            load average per CPU above which to reduce the limit
+        min_memory : float, optional
+            fraction of system memory available below which to reduce the
+            limit
+        interval : float, optional
+            seconds between adjustments of the limit
+        hold : int, optional
+            number of intervals to keep the limit after dropping it for a
+            fall in the rate of finished commands
+        """
+        n_cpus = os.cpu_count() or 1
+        if max_workers is None:
+            max_workers = 4 * n_cpus
+        if start is None:
+            start = min(n_cpus, max_workers)
+        if not 1 <= min_workers <= start <= max_workers:
+            raise ValueError('Need 1 <= min_workers <= start <= max_workers')
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.max_load = max_load
+        self.min_memory = min_memory
+        self.interval = interval
+        self.hold = hold
+        self.limit = start
+        self._lock = threading.Lock()
+        self._window_start = perf_counter()
+        self._n_done = 0
+        self._last_rate = None
+        self._last_step = 0
+        self._hold_length = hold
+        self._hold_left = 0
+
+    def memory_available(self):
+        """ Return fraction of system memory available, or None """
+        return memory_available()
+
+    def load_per_cpu(self):
+        """ Return load average per CPU, or None """
+        return load_per_cpu()
+
+    def job_done(self):
+        """ Record finished command, adjust limit if interval has passed
+        """
+        with self._lock:
+            self._n_done += 1
+            elapsed = perf_counter() - self._window_start
+            if elapsed < self.interval:
+                return
+            rate = self._n_done / elapsed if elapsed > 0 else float('inf')
+            self._adjust(rate)
+            self._window_start = perf_counter()
+            self._n_done = 0
+
+    def _adjust(self, rate):
+        memory = self.memory_available()
+        load = self.load_per_cpu()
+        low_memory = memory is not None and memory < self.min_memory
+        high_load = load is not None and load > self.max_load
+        rate_fell = self._last_rate is not None and rate < self._last_rate
+        if low_memory or high_load:
+            step = -max(1, self.limit // 4) if low_memory else -1
+            # Drop for memory or load ends any hold
+            self._hold_left = 0
+            self._hold_length = self.hold
+        elif self._last_step > 0 and rate_fell:
+            # Back to the last good limit, and stay there for a while
+            step = -1
+            self._hold_left = self._hold_length
+            self._hold_length = min(2 * self._hold_length, 16 * self.hold)
+        elif self._hold_left:
+            step = 0
+            self._hold_left -= 1
+        else:
+            step = 1
+            if self._last_step > 0:
+                # Last increase did not reduce the rate
+                self._hold_length = self.hold
+        limit = min(max(self.limit + step, self.min_workers),
+                    self.max_workers)
+        self._last_step = limit - self.limit
+        self._last_rate = rate
+        self.limit = limit
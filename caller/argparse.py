@@ -74,10 +74,12 @@ still considered an implementation detail.)
 
 __version__ = '0.9.1'
 
+import bisect as _bisect
 import os as _os
 import re as _re
 import sys as _sys
 import textwrap as _textwrap
+import threading as _threading
 
 from gettext import gettext as _
 
@@ -93,6 +95,10 @@ ZERO_OR_MORE = '*'
 ONE_OR_MORE = '+'
 PARSER = '==PARSER=='
 
+# parse_many sets active on this, so that parse errors raise ArgumentError
+# rather than exiting
+_bulk_parsing = _threading.local()
+
 # =============================
 # Utility functions and classes
 # =============================
@@ -128,6 +134,103 @@ def _ensure_value(namespace, name, value):
     return getattr(namespace, name)
 
 
+class _PatternRuns(object):
+    """Lengths of runs of characters in an arg strings pattern.
+
+    get(chars)[i] is the number of characters from chars at the start of
+    pattern[i:].  The lists have an extra zero at the end, for the end of
+    the pattern.
+    """
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.none = [0] * (len(pattern) + 1)
+        self.is_arg = [char == 'A' for char in pattern] + [False]
+        self._runs = {}
+
+    def get(self, chars):
+        try:
+            return self._runs[chars]
+        except KeyError:
+            pass
+        runs = [0]
+        for char in reversed(self.pattern):
+            runs.append(runs[-1] + 1 if char in chars else 0)
+        runs.reverse()
+        self._runs[chars] = runs
+        return runs
+
+
+class _OptionStringIndex(dict):
+    """Mapping of option strings to actions, with a sorted index of keys.
+
+    The sorted index finds the option strings starting with a prefix by
+    bisection, rather than by checking every option string.  The index is
+    rebuilt on the first search after the mapping changes.  Matches come
+    back in insertion order, as for iterating over the mapping.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(_OptionStringIndex, self).__init__(*args, **kwargs)
+        self._sorted_keys = None
+        self._positions = None
+
+    def _changed(self):
+        self._sorted_keys = None
+        self._positions = None
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._changed()
+        super(_OptionStringIndex, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super(_OptionStringIndex, self).__delitem__(key)
+        self._changed()
+
+    def pop(self, *args):
+        self._changed()
+        return super(_OptionStringIndex, self).pop(*args)
+
+    def popitem(self):
+        self._changed()
+        return super(_OptionStringIndex, self).popitem()
+
+    def clear(self):
+        self._changed()
+        super(_OptionStringIndex, self).clear()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._changed()
+        return super(_OptionStringIndex, self).setdefault(key, default)
+
+    def update(self, *args, **kwargs):
+        self._changed()
+        super(_OptionStringIndex, self).update(*args, **kwargs)
+
+    def _index(self):
+        if self._sorted_keys is None:
+            self._positions = dict((key, i) for i, key in enumerate(self))
+            self._sorted_keys = sorted(self)
+        return self._sorted_keys
+
+    def startswith(self, prefix):
+        """Return option strings starting with prefix, in insertion order"""
+        keys = self._index()
+        matches = []
+        i = _bisect.bisect_left(keys, prefix)
+        while i < len(keys) and keys[i].startswith(prefix):
+            matches.append(keys[i])
+            i += 1
+        return sorted(matches, key=self._positions.__getitem__)
+
+    def position(self, key):
+        """Return position of key in insertion order"""
+        self._index()
+        return self._positions[key]
+
+
 # ===============
 # Formatting Help
 # ===============
@@ -568,7 +671,9 @@ class RawTextHelpFormatter(RawDescriptionHelpFormatter):
 # =====================
 
 def _get_action_name(argument):
-    if argument.option_strings:
+    if argument is None:
+        return None
+    elif argument.option_strings:
         return  '/'.join(argument.option_strings)
     elif argument.metavar not in (None, SUPPRESS):
         return argument.metavar
@@ -876,6 +981,9 @@ class _HelpAction(Action):
             help=help)
 
     def __call__(self, parser, namespace, values, option_string=None):
+        if getattr(_bulk_parsing, 'active', False):
+            # parse_many gives the help as the error message, unprinted
+            parser.exit(message=parser.format_help())
         parser.print_help()
         parser.exit()
 
@@ -895,6 +1003,9 @@ class _VersionAction(Action):
             help=help)
 
     def __call__(self, parser, namespace, values, option_string=None):
+        if getattr(_bulk_parsing, 'active', False):
+            # parse_many gives the version as the error message, unprinted
+            parser.exit(message=parser.format_version())
         parser.print_version()
         parser.exit()
 
@@ -942,6 +1053,11 @@ class _SubParsersAction(Action):
         # create the parser and add it to the map
         parser = self._parser_class(**kwargs)
         self._name_parser_map[name] = parser
+
+        # the choices appear in the usage and help of the container
+        container = getattr(self, 'container', None)
+        if container is not None:
+            container._changed()
         return parser
 
     def _get_subactions(self):
@@ -1062,7 +1178,7 @@ class _ActionsContainer(object):
 
         # action storage
         self._actions = []
-        self._option_string_actions = {}
+        self._option_string_actions = _OptionStringIndex()
 
         # groups
         self._action_groups = []
@@ -1078,6 +1194,13 @@ class _ActionsContainer(object):
         # numbers -- uses a list so it can be shared and edited
         self._has_negative_number_optionals = []
 
+        # count of changes to actions and groups, to invalidate formatted
+        # usage and help -- uses a list so it can be shared and edited
+        self._changes = [0]
+
+    def _changed(self):
+        self._changes[0] += 1
+
     # ====================
     # Registration methods
     # ====================
@@ -1092,6 +1215,7 @@ class _ActionsContainer(object):
     # Namespace default settings methods
     # ==================================
     def set_defaults(self, **kwargs):
+        self._changed()
         self._defaults.update(kwargs)
 
         # if these defaults match any existing arguments, replace
@@ -1134,16 +1258,20 @@ class _ActionsContainer(object):
         return self._add_action(action)
 
     def add_argument_group(self, *args, **kwargs):
+        self._changed()
         group = _ArgumentGroup(self, *args, **kwargs)
         self._action_groups.append(group)
         return group
 
     def add_mutually_exclusive_group(self, **kwargs):
+        self._changed()
         group = _MutuallyExclusiveGroup(self, **kwargs)
         self._mutually_exclusive_groups.append(group)
         return group
 
     def _add_action(self, action):
+        self._changed()
+
         # resolve any conflicts
         self._check_conflict(action)
 
@@ -1165,6 +1293,7 @@ class _ActionsContainer(object):
         return action
 
     def _remove_action(self, action):
+        self._changed()
         self._actions.remove(action)
 
     def _add_container_actions(self, container):
@@ -1327,6 +1456,7 @@ class _ArgumentGroup(_ActionsContainer):
         self._defaults = container._defaults
         self._has_negative_number_optionals = \
             container._has_negative_number_optionals
+        self._changes = container._changes
 
     def _add_action(self, action):
         action = super(_ArgumentGroup, self)._add_action(action)
@@ -1371,7 +1501,8 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
                  prefix_chars='-',
                  argument_default=None,
                  conflict_handler='error',
-                 add_help=True):
+                 add_help=True,
+                 positional_allocation='regex'):
 
         superinit = super(ArgumentParser, self).__init__
         superinit(description=description,
@@ -1390,8 +1521,22 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         self.formatter_class = formatter_class
         self.add_help = add_help
 
+        # engine for allocating arg strings to positionals; 'regex' matches
+        # the nargs patterns with regular expressions, 'linear' finds the
+        # same allocation in time linear in the number of arg strings
+        if positional_allocation not in ('regex', 'linear'):
+            msg = _('invalid positional_allocation: %r')
+            raise ValueError(msg % positional_allocation)
+        self.positional_allocation = positional_allocation
+
         self._has_subparsers = False
 
+        # compiled nargs regexes, keyed by the nargs settings of the actions
+        self._nargs_regexes = {}
+
+        # formatted usage and help, with the state they were formatted for
+        self._formatted = {}
+
         add_group = self.add_argument_group
         self._positionals = add_group(_('positional arguments'))
         self._optionals = add_group(_('optional arguments'))
@@ -1434,6 +1579,7 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
             'formatter_class',
             'conflict_handler',
             'add_help',
+            'positional_allocation',
         ]
         return [(name, getattr(self, name)) for name in names]
 
@@ -1490,6 +1636,44 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         if args is None:
             args = _sys.argv[1:]
 
+        namespace = self._default_namespace(namespace)
+
+        # parse the arguments and exit if there are any errors
+        try:
+            return self._parse_args(args, namespace)
+        except ArgumentError:
+            err = _sys.exc_info()[1]
+            self._parse_error(str(err))
+
+    def parse_many(self, args_list):
+        """parse_many(args_list: iterable of lists of strings)
+
+        Parses each list of strings in args_list, as for parse_args, and
+        returns a list with a Namespace for each list of strings that
+        parses, or the ArgumentError for each list that does not.  Errors
+        do not print messages or exit.  Actions that exit give an
+        ArgumentError; for help and version, the message is the help or
+        version text.
+        """
+        action_conflicts = self._get_action_conflicts()
+        was_active = getattr(_bulk_parsing, 'active', False)
+        _bulk_parsing.active = True
+        results = []
+        try:
+            for args in args_list:
+                try:
+                    namespace = self._default_namespace()
+                    namespace = self._parse_args(list(args), namespace,
+                                                 action_conflicts)
+                except ArgumentError:
+                    results.append(_sys.exc_info()[1])
+                else:
+                    results.append(namespace)
+        finally:
+            _bulk_parsing.active = was_active
+        return results
+
+    def _default_namespace(self, namespace=None):
         # default Namespace built from parser defaults
         if namespace is None:
             namespace = Namespace()
@@ -1509,14 +1693,9 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
             if not hasattr(namespace, dest):
                 setattr(namespace, dest, self._defaults[dest])
 
-        # parse the arguments and exit if there are any errors
-        try:
-            return self._parse_args(args, namespace)
-        except ArgumentError:
-            err = _sys.exc_info()[1]
-            self.error(str(err))
+        return namespace
 
-    def _parse_args(self, arg_strings, namespace):
+    def _get_action_conflicts(self):
         # map all mutually exclusive arguments to the other arguments
         # they can't occur with
         action_conflicts = {}
@@ -1526,6 +1705,11 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
                 conflicts = action_conflicts.setdefault(mutex_action, [])
                 conflicts.extend(group_actions[:i])
                 conflicts.extend(group_actions[i + 1:])
+        return action_conflicts
+
+    def _parse_args(self, arg_strings, namespace, action_conflicts=None):
+        if action_conflicts is None:
+            action_conflicts = self._get_action_conflicts()
 
         # find all option indices, and determine the arg_string_pattern
         # which has an 'O' if there is an option at an index,
@@ -1594,7 +1778,7 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
 
                 # if we found no optional action, raise an error
                 if action is None:
-                    self.error(_('no such option: %s') % option_string)
+                    self._parse_error(_('no such option: %s') % option_string)
 
                 # if there is an explicit argument, try to match the
                 # optional's string arguments to only this
@@ -1705,7 +1889,7 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
             if start_index not in option_string_indices:
                 msg = _('extra arguments found: %s')
                 extras = arg_strings[start_index:next_option_string_index]
-                self.error(msg % ' '.join(extras))
+                self._parse_error(msg % ' '.join(extras))
 
             # consume the next optional and any arguments for it
             start_index = consume_optional(start_index)
@@ -1717,19 +1901,19 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         # many supplied
         if stop_index != len(arg_strings):
             extras = arg_strings[stop_index:]
-            self.error(_('extra arguments found: %s') % ' '.join(extras))
+            self._parse_error(_('extra arguments found: %s') % ' '.join(extras))
 
         # if we didn't use all the Positional objects, there were too few
         # arg strings supplied.
         if positionals:
-            self.error(_('too few arguments'))
+            self._parse_error(_('too few arguments'))
 
         # make sure all required actions were present
         for action in self._actions:
             if action.required:
                 if action not in seen_actions:
                     name = _get_action_name(action)
-                    self.error(_('argument %s is required') % name)
+                    self._parse_error(_('argument %s is required') % name)
 
         # make sure all required groups had one option present
         for group in self._mutually_exclusive_groups:
@@ -1744,15 +1928,15 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
                              for action in group._group_actions
                              if action.help is not SUPPRESS]
                     msg = _('one of the arguments %s is required')
-                    self.error(msg % ' '.join(names))
+                    self._parse_error(msg % ' '.join(names))
 
         # return the updated namespace
         return namespace
 
     def _match_argument(self, action, arg_strings_pattern):
         # match the pattern for this action to the arg strings
-        nargs_pattern = self._get_nargs_pattern(action)
-        match = _re.match(nargs_pattern, arg_strings_pattern)
+        nargs_regex = self._get_nargs_regex((action,))
+        match = nargs_regex.match(arg_strings_pattern)
 
         # raise an exception if we weren't able to find a match
         if match is None:
@@ -1769,14 +1953,16 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         return len(match.group(1))
 
     def _match_arguments_partial(self, actions, arg_strings_pattern):
+        if self.positional_allocation == 'linear':
+            return self._allocate_arguments(actions, arg_strings_pattern)
+
         # progressively shorten the actions list by slicing off the
         # final actions until we find a match
         result = []
         for i in range(len(actions), 0, -1):
             actions_slice = actions[:i]
-            pattern = ''.join(self._get_nargs_pattern(action)
-                              for action in actions_slice)
-            match = _re.match(pattern, arg_strings_pattern)
+            nargs_regex = self._get_nargs_regex(actions_slice)
+            match = nargs_regex.match(arg_strings_pattern)
             if match is not None:
                 result.extend(len(string) for string in match.groups())
                 break
@@ -1784,6 +1970,131 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         # return the list of arg string counts
         return result
 
+    def _allocate_arguments(self, actions, arg_strings_pattern):
+        # find the same arg string counts as _match_arguments_partial,
+        # without regular expressions.  The ends of the matches of each
+        # nargs pattern, from a given start, form a range, and the regular
+        # expression engine prefers later ends.  A forward pass finds the
+        # ends each action can reach, and so the longest list of actions
+        # that matches; a backward pass finds the starts from which the
+        # remaining actions can match; then the counts come from taking
+        # the latest end from which the remaining actions can match.
+        n_strings = len(arg_strings_pattern)
+        runs = _PatternRuns(arg_strings_pattern)
+        positions = range(n_strings + 1)
+
+        # forward pass; ranges[i][start] is the range of ends for action i
+        reached = [True] + [False] * n_strings
+        ranges = []
+        for action in actions:
+            action_ranges = [None] * (n_strings + 1)
+            starts = [0] * (n_strings + 2)
+            for start in positions:
+                if reached[start]:
+                    end_range = self._get_nargs_range(action, runs, start)
+                    if end_range is not None:
+                        action_ranges[start] = end_range
+                        starts[end_range[0]] += 1
+                        starts[end_range[1] + 1] -= 1
+            reached = []
+            n_open = 0
+            for position in positions:
+                n_open += starts[position]
+                reached.append(n_open > 0)
+            if not any(reached):
+                break
+            ranges.append(action_ranges)
+
+        # backward pass; latest[position] is the latest position up to and
+        # including position from which the remaining actions can match
+        latest = list(positions)
+        latests = [latest]
+        for action_ranges in reversed(ranges):
+            matches = [False] * (n_strings + 1)
+            for start in positions:
+                end_range = action_ranges[start]
+                if end_range is not None:
+                    first, last = end_range
+                    matches[start] = latest[last] >= first
+            latest = []
+            previous = -1
+            for position in positions:
+                if matches[position]:
+                    previous = position
+                latest.append(previous)
+            latests.append(latest)
+        latests.reverse()
+
+        # take the latest end for each action
+        result = []
+        start = 0
+        for i, action_ranges in enumerate(ranges):
+            end = latests[i + 1][action_ranges[start][1]]
+            result.append(end - start)
+            start = end
+        return result
+
+    def _get_nargs_range(self, action, runs, start):
+        # return the first and last end of matches of the nargs pattern for
+        # action from start, or None if there is no match.  This follows
+        # the patterns from _get_nargs_pattern
+        nargs = action.nargs
+        if action.option_strings:
+            dashes = runs.none
+            many = runs.get('A')
+            parser_many = runs.get('AO')
+        else:
+            dashes = runs.get('-')
+            many = runs.get('A-')
+            parser_many = runs.get('A-O')
+        is_arg = runs.is_arg
+
+        # one argument, with any dashes before or after
+        if nargs is None:
+            position = start + dashes[start]
+            if not is_arg[position]:
+                return None
+            position += 1
+            return position, position + dashes[position]
+
+        # the argument is optional; dashes alone can match
+        elif nargs == OPTIONAL:
+            position = start + dashes[start]
+            if not is_arg[position]:
+                return start, position
+            position += 1
+            return start, position + dashes[position]
+
+        # any number of arguments and dashes
+        elif nargs == ZERO_OR_MORE:
+            return start, start + many[start]
+
+        # an argument, then any number of arguments and dashes
+        elif nargs == ONE_OR_MORE:
+            position = start + dashes[start]
+            if not is_arg[position]:
+                return None
+            position += 1
+            return position, position + many[position]
+
+        # an argument, then anything
+        elif nargs is PARSER:
+            position = start + dashes[start]
+            if not is_arg[position]:
+                return None
+            position += 1
+            return position, position + parser_many[position]
+
+        # exactly nargs arguments, with any dashes between them
+        else:
+            position = start
+            for i in range(nargs):
+                position += dashes[position]
+                if not is_arg[position]:
+                    return None
+                position += 1
+            return position, position + dashes[position]
+
     def _parse_optional(self, arg_string):
         # if it's an empty string, it was meant to be a positional
         if not arg_string:
@@ -1814,7 +2125,7 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         if len(option_tuples) > 1:
             options = ', '.join(opt_str for _, opt_str, _ in option_tuples)
             tup = arg_string, options
-            self.error(_('ambiguous option: %s could match %s') % tup)
+            self._parse_error(_('ambiguous option: %s could match %s') % tup)
 
         # if exactly one action matched, this segmentation is good,
         # so return the parsed action
@@ -1845,11 +2156,11 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
             else:
                 option_prefix = option_string
                 explicit_arg = None
-            for option_string in self._option_string_actions:
-                if option_string.startswith(option_prefix):
-                    action = self._option_string_actions[option_string]
-                    tup = action, option_string, explicit_arg
-                    result.append(tup)
+            option_strings = self._option_string_actions
+            for option_string in option_strings.startswith(option_prefix):
+                action = option_strings[option_string]
+                tup = action, option_string, explicit_arg
+                result.append(tup)
 
         # single character options can be concatenated with their arguments
         # but multiple character options always have to have their argument
@@ -1860,23 +2171,44 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
             short_option_prefix = option_string[:2]
             short_explicit_arg = option_string[2:]
 
-            for option_string in self._option_string_actions:
+            # the short option prefix is the only match not starting with
+            # the whole option string
+            option_strings = self._option_string_actions
+            matches = option_strings.startswith(option_prefix)
+            if (short_option_prefix in option_strings and
+                short_option_prefix not in matches):
+                matches.append(short_option_prefix)
+                matches.sort(key=option_strings.position)
+            for option_string in matches:
+                action = option_strings[option_string]
                 if option_string == short_option_prefix:
-                    action = self._option_string_actions[option_string]
                     tup = action, option_string, short_explicit_arg
-                    result.append(tup)
-                elif option_string.startswith(option_prefix):
-                    action = self._option_string_actions[option_string]
+                else:
                     tup = action, option_string, explicit_arg
-                    result.append(tup)
+                result.append(tup)
 
         # shouldn't ever get here
         else:
-            self.error(_('unexpected option string: %s') % option_string)
+            self._parse_error(_('unexpected option string: %s') % option_string)
 
         # return the collected option tuples
         return result
 
+    def _get_nargs_regex(self, actions):
+        # the pattern depends only on the nargs of each action, and on
+        # whether it is an optional, so key the cache by these values; the
+        # cache is then correct even if actions change after parsing
+        key = tuple((action.nargs, bool(action.option_strings))
+                    for action in actions)
+        try:
+            return self._nargs_regexes[key]
+        except KeyError:
+            pass
+        pattern = ''.join(self._get_nargs_pattern(action)
+                          for action in actions)
+        nargs_regex = self._nargs_regexes[key] = _re.compile(pattern)
+        return nargs_regex
+
     def _get_nargs_pattern(self, action):
         # in all examples below, we have to allow for '--' args
         # which are represented as '-' in the pattern
@@ -1991,13 +2323,38 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
     # =======================
     # Help-formatting methods
     # =======================
+    def _get_formatted(self, name, format_func):
+        # return memoized text from format_func, formatting again if
+        # actions, groups or parser attributes used in formatting have
+        # changed.  Changes to the attributes of existing actions are not
+        # detected.
+        state = (self._changes[0], self.prog, self.usage, self.description,
+                 self.epilog, self.formatter_class,
+                 _os.environ.get('COLUMNS'))
+        try:
+            formatted_state, text = self._formatted[name]
+        except KeyError:
+            pass
+        else:
+            if formatted_state == state:
+                return text
+        text = format_func()
+        self._formatted[name] = state, text
+        return text
+
     def format_usage(self):
+        return self._get_formatted('usage', self._format_usage)
+
+    def _format_usage(self):
         formatter = self._get_formatter()
         formatter.add_usage(self.usage, self._actions,
                             self._mutually_exclusive_groups)
         return formatter.format_help()
 
     def format_help(self):
+        return self._get_formatted('help', self._format_help)
+
+    def _format_help(self):
         formatter = self._get_formatter()
 
         # usage
@@ -2050,6 +2407,10 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
     # Exiting methods
     # ===============
     def exit(self, status=0, message=None):
+        if getattr(_bulk_parsing, 'active', False):
+            if not message:
+                message = _('exit with status %d') % status
+            raise ArgumentError(None, message.strip())
         if message:
             _sys.stderr.write(message)
         _sys.exit(status)
@@ -2065,3 +2426,10 @@ class ArgumentParser(_AttributeHolder, _ActionsContainer):
         """
         self.print_usage(_sys.stderr)
         self.exit(2, _('%s: error: %s\n') % (self.prog, message))
+
+    def _parse_error(self, message):
+        # errors while parsing raise ArgumentError for parse_many, and
+        # otherwise go to error, which may be overridden
+        if getattr(_bulk_parsing, 'active', False):
+            raise ArgumentError(None, message)
+        self.error(message)
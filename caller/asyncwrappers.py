@@ -0,0 +1,59 @@
+""" Wrappers running applications from an asyncio event loop
+
+``subprocess.Popen.communicate`` blocks the calling thread until the child
+finishes.  The wrapper here uses ``asyncio.create_subprocess_exec`` instead,
+so that a single event loop can drive many concurrent invocations.
+"""
+
+import asyncio
+from io import BytesIO
+
+from .wrappers import ShellWrapper
+
+
+class AsyncShellWrapper(ShellWrapper):
+    """ Wrap system command line application, adding coroutine ``arun``
+
+    To get an asynchronous version of an existing ``ShellWrapper`` subclass,
+    mix this class in after the existing subclass.
+
+    Examples
+    --------
+    >>> import asyncio, sys
+    >>> from caller import ParameterDefinitions, Positional
+    >>> class Echo(AsyncShellWrapper):
+    ...     cmd = (sys.executable, '-c', 'import sys; print(sys.argv[1])')
+    ...     parameter_definitions = ParameterDefinitions(
+    ...         (Positional('word'),))
+    >>> res = asyncio.run(Echo(('hello',)).arun())
+    >>> res.stdout.getvalue().strip() == b'hello'
+    True
+    """
+    async def arun(self):
+        """ Execute implied command in event loop, return results object
+
+        Returns
+        -------
+        res_obj : object
+            results object instance, as for ``run``
+        """
+        return self.result_maker(*(await self._aexecute(self.cmdline())))
+
+    async def _aexecute(self, cmd):
+        """ Raw asynchronous execute of command `cmd`
+
+        Parameters
+        ----------
+        cmd : sequence
+            command line sequence
+        """
+        cmd = list(cmd)
+        if self.shell:
+            # As for ``Popen(cmd, shell=True)`` with a sequence
+            cmd = ['/bin/sh', '-c'] + cmd
+        child = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE)
+        (out, err) = await child.communicate()
+        return child.returncode, BytesIO(out), BytesIO(err)
@@ -0,0 +1,13 @@
+""" Benchmarks for caller
+
+The benchmark classes follow the conventions of `airspeed velocity
+<https://asv.readthedocs.io>`_: ``params`` and ``param_names`` class
+attributes, a ``setup`` method and ``time_*`` methods taking the parameter
+values.  ``setup`` raises ``NotImplementedError`` to skip a benchmark.
+
+To run the benchmarks without asv, and write results as JSON::
+
+    python -m caller.benchmarks --output results.json
+
+Run ``python -m caller.benchmarks --help`` for more options.
+"""
@@ -0,0 +1,107 @@
+""" Run caller benchmarks, print or save results as JSON
+
+Each result records the benchmark name, the parameter values, the number of
+calls per timing, and the best and mean time per call, in seconds, over the
+repeats.
+"""
+
+import sys
+import json
+import timeit
+import platform
+import itertools
+import importlib
+import pkgutil
+
+import caller.benchmarks
+from caller import argparse
+
+
+def iter_benchmarks(package=caller.benchmarks):
+    """ Generate (name, class, method name) for benchmarks in `package` """
+    for info in pkgutil.iter_modules(package.__path__):
+        if not info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module(package.__name__ + '.' + info.name)
+        for cls_name, cls in sorted(vars(module).items()):
+            if (not isinstance(cls, type) or
+                cls.__module__ != module.__name__):
+                continue
+            for meth_name in sorted(dir(cls)):
+                if meth_name.startswith('time_'):
+                    name = '%s.%s.%s' % (info.name, cls_name, meth_name)
+                    yield name, cls, meth_name
+
+
+def param_combinations(cls):
+    """ Return list of parameter tuples for benchmark class `cls` """
+    params = getattr(cls, 'params', [])
+    if not params:
+        return [()]
+    if not isinstance(params[0], (list, tuple)):
+        params = [params]
+    return list(itertools.product(*params))
+
+
+def run_benchmark(cls, meth_name, params, repeat=5):
+    """ Time method `meth_name` of `cls` with `params`, return result dict
+
+    Returns None if benchmark setup raises ``NotImplementedError``.
+    """
+    bench = cls()
+    if hasattr(bench, 'setup'):
+        try:
+            bench.setup(*params)
+        except NotImplementedError:
+            return None
+    method = getattr(bench, meth_name)
+    timer = timeit.Timer(lambda: method(*params))
+    number = getattr(bench, 'number', 0)
+    if not number:
+        number = timer.autorange()[0]
+    times = [t / number for t in timer.repeat(repeat, number)]
+    if hasattr(bench, 'teardown'):
+        bench.teardown(*params)
+    return {'number': number,
+            'repeat': repeat,
+            'best': min(times),
+            'mean': sum(times) / len(times)}
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', '-o',
+                        help='file to write JSON results (default stdout)')
+    parser.add_argument('--filter', '-k', default='',
+                        help='only run benchmarks with this in their name')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='number of timings per benchmark')
+    opts = parser.parse_args(args)
+    results = []
+    for name, cls, meth_name in iter_benchmarks():
+        if opts.filter not in name:
+            continue
+        param_names = getattr(cls, 'param_names', [])
+        for params in param_combinations(cls):
+            result = run_benchmark(cls, meth_name, params, opts.repeat)
+            if result is None:
+                sys.stderr.write('Skipped %s %s\n' % (name, params))
+                continue
+            result['name'] = name
+            result['params'] = dict(zip(param_names, params))
+            results.append(result)
+            sys.stderr.write('%s %s: %.3g s\n' %
+                             (name, params, result['best']))
+    report = {'python': platform.python_version(),
+              'machine': platform.machine(),
+              'results': results}
+    if opts.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(opts.output, 'wt') as fobj:
+            json.dump(report, fobj, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+""" Benchmarks for argument parsing
+"""
+
+from caller import argparse
+
+
+class ParseArgs(object):
+    params = [10, 100, 1000]
+    param_names = ['n_args']
+
+    def setup(self, n_args):
+        parser = argparse.ArgumentParser()
+        for i in range(10):
+            parser.add_argument('--option%d' % i)
+        parser.add_argument('--flag', action='store_true')
+        parser.add_argument('first')
+        parser.add_argument('rest', nargs='*')
+        self.parser = parser
+        # Positionals, then options, some abbreviated
+        argv = ['first']
+        argv += ['positional%d' % i for i in range(n_args // 2)]
+        for i in range(n_args - n_args // 2):
+            if i % 2:
+                argv.append('--fl')
+            else:
+                argv += ['--option%d' % (i % 10), 'value']
+        self.argv = argv
+
+    def time_parse_args(self, n_args):
+        self.parser.parse_args(self.argv)
+
+
+class AbbreviatedOptions(object):
+    params = [10, 100, 1000]
+    param_names = ['n_options']
+
+    def setup(self, n_options):
+        parser = argparse.ArgumentParser()
+        for i in range(n_options):
+            parser.add_argument('--option%d-value' % i)
+        self.parser = parser
+        # Unique abbreviations of the last ten options
+        self.argv = []
+        for i in range(n_options - 10, n_options):
+            self.argv += ['--option%d-val' % i, 'value']
+
+    def time_parse_args(self, n_options):
+        self.parser.parse_args(self.argv)
+
+
+class AllocatePositionals(object):
+    params = [['regex', 'linear'], [2, 4, 6]]
+    param_names = ['positional_allocation', 'n_positionals']
+
+    def setup(self, positional_allocation, n_positionals):
+        parser = argparse.ArgumentParser(
+            positional_allocation=positional_allocation)
+        for i in range(n_positionals):
+            parser.add_argument('positional%d' % i, nargs='*')
+        parser.add_argument('last', nargs=40)
+        parser.add_argument('--flag', action='store_true')
+        self.parser = parser
+        # There are too few arguments before the option for 'last', so the
+        # regex engine tries all ways of splitting them between the
+        # positionals before giving up
+        self.argv = ['first%d' % i for i in range(30)] + ['--flag']
+        self.argv += ['last%d' % i for i in range(40)]
+
+    def time_parse_args(self, positional_allocation, n_positionals):
+        self.parser.parse_args(self.argv)
+
+
+class FormatUsage(object):
+    params = [10, 100]
+    param_names = ['n_options']
+
+    def setup(self, n_options):
+        parser = argparse.ArgumentParser(prog='prog')
+        for i in range(n_options):
+            parser.add_argument('--option%d' % i)
+        parser.add_argument('first')
+        self.parser = parser
+
+    def time_format_usage(self, n_options):
+        self.parser.format_usage()
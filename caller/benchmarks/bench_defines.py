@@ -0,0 +1,68 @@
+""" Benchmarks for parameter checking and command line rendering
+"""
+
+from caller import Positional, Option, Flag
+from caller.defines import ParameterDefinitions
+
+
+def make_param_defs(n_params):
+    """ Return parameter definitions, values for `n_params` of each kind """
+    poses = tuple(Positional('pos%d' % i, ['p%d' % i])
+                  for i in range(n_params))
+    opts = tuple(Option('opt%d' % i, ['o%d' % i], checker=str)
+                 for i in range(n_params))
+    flags = tuple(Flag('flag%d' % i) for i in range(n_params))
+    pos_values = tuple('value%d' % i for i in range(n_params))
+    named = dict(('o%d' % i, i) for i in range(n_params))
+    named.update(('flag%d' % i, i % 2) for i in range(n_params))
+    return ParameterDefinitions(poses, opts + flags), pos_values, named
+
+
+class ParameterToString(object):
+    params = ['positional', 'option', 'flag']
+    param_names = ['kind']
+
+    def setup(self, kind):
+        self.param = {'positional': Positional('param1'),
+                      'option': Option('option1', checker=float),
+                      'flag': Flag('flag1')}[kind]
+
+    def time_to_string(self, kind):
+        self.param.to_string(1)
+
+
+class ParameterDefinitionsBench(object):
+    params = [1, 10, 100]
+    param_names = ['n_params']
+
+    def setup(self, n_params):
+        self.pdefs, self.positionals, self.named = make_param_defs(n_params)
+        self.checked = self.pdefs.checked_values(self.positionals, self.named)
+        self.template = self.pdefs.compile('cmd')
+
+    def time_checked_values(self, n_params):
+        self.pdefs.checked_values(self.positionals, self.named)
+
+    def time_make_cmdline(self, n_params):
+        self.pdefs.make_cmdline('cmd', self.positionals, self.named)
+
+    def time_make_cmdline_checked(self, n_params):
+        self.pdefs.make_cmdline('cmd', *self.checked, checked=True)
+
+    def time_template_render(self, n_params):
+        self.template.render(*self.checked, checked=True)
+
+
+class MakeCmdlinesBench(object):
+    params = [10, 1000]
+    param_names = ['n_rows']
+
+    def setup(self, n_rows):
+        self.pdefs, positionals, named = make_param_defs(10)
+        self.rows = dict(('p%d' % i, [value] * n_rows)
+                         for i, value in enumerate(positionals))
+        self.rows.update((key, [value] * n_rows)
+                         for key, value in named.items())
+
+    def time_make_cmdlines(self, n_rows):
+        self.pdefs.make_cmdlines('cmd', self.rows)
@@ -0,0 +1,33 @@
+""" Benchmarks for ordering pipeline jobs by their dependencies
+"""
+
+from caller import Positional
+from caller.defines import ParameterDefinitions
+from caller.wrappers import ShellWrapper
+from caller.pipeline import Pipeline
+
+
+class FileWrapper(ShellWrapper):
+    cmd = 'true'
+    parameter_definitions = ParameterDefinitions(
+        (Positional('outfile', param_types=('output', 'file')),
+         Positional('infiles', param_types=('input', 'file'))),
+        pos_last_repeat=True)
+
+
+class PipelineOrderBench(object):
+    params = [10, 100, 1000]
+    param_names = ['n_jobs']
+
+    def setup(self, n_jobs):
+        # Chain of jobs, added last first, each also reading the first file
+        self.pipeline = Pipeline()
+        for i in range(n_jobs - 1, 0, -1):
+            self.pipeline.add(FileWrapper(('f%d' % i, 'f%d' % (i - 1), 'f0')))
+        self.pipeline.add(FileWrapper(('f0',)))
+
+    def time_dependencies(self, n_jobs):
+        self.pipeline.dependencies()
+
+    def time_order(self, n_jobs):
+        self.pipeline.order()
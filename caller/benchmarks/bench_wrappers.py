@@ -0,0 +1,53 @@
+""" Benchmarks for running wrapped commands
+"""
+
+import sys
+from os.path import join as pjoin, dirname
+
+from caller import Positional, Option, ParameterDefinitions, ShellWrapper
+
+
+class App1Wrapper(ShellWrapper):
+    cmd = (sys.executable,
+           pjoin(dirname(dirname(__file__)), 'tests', 'scripts', 'app1.py'))
+    parameter_definitions = ParameterDefinitions(
+        positional_defines = (
+            Positional(name='param1', is_required=True),
+            Positional(name='param2', is_required=True),
+            ),
+        option_defines = (
+            Option(name='option1', aliases=['-1'], checker = str),
+            ))
+
+
+class ShellWrapperRun(object):
+    params = ['memory', 'spill', 'stream']
+    param_names = ['capture']
+    # Each run starts a Python interpreter
+    number = 10
+
+    def setup(self, capture):
+        self.wrapper = App1Wrapper(('arg1', 'arg2'), {'option1': 'opt1'})
+        if self.wrapper.run().result_code != 0:
+            # Probably caller is not on the Python path
+            raise NotImplementedError('app1.py does not run')
+
+    def time_run(self, capture):
+        self.wrapper.run(capture=capture).wait()
+
+
+class ShellWrapperSpawn(object):
+    params = ['popen', 'posix_spawn']
+    param_names = ['spawn']
+
+    def setup(self, spawn):
+        # Make a large parent (with memory pages touched), where fork is slow
+        self.ballast = bytearray(b'\x01') * 2 ** 28
+        self.wrapper = App1Wrapper(('arg1', 'arg2'))
+        self.cmd = ('true',)
+
+    def teardown(self, spawn):
+        del self.ballast
+
+    def time_spawn(self, spawn):
+        self.wrapper._execute(self.cmd, spawn=spawn)
@@ -0,0 +1,152 @@
+""" Caching results of wrapped commands
+
+For commands that are pure functions of their command line and input files,
+we can key the results on the command line, and signatures of the input
+files.
+"""
+
+import os
+import hashlib
+import pickle
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+def file_signature(path, hash_contents=False):
+    """ Return tuple identifying state of file at `path`
+
+    Parameters
+    ----------
+    path : str
+        filename
+    hash_contents : {False, True}, optional
+        If False, identify file from size and modification time.  If True,
+        identify file from SHA1 hash of its contents.
+
+    Returns
+    -------
+    signature : tuple
+
+    Notes
+    -----
+    Raises OSError if `path` does not exist.
+    """
+    if not hash_contents:
+        stat = os.stat(path)
+        return (path, stat.st_size, stat.st_mtime_ns)
+    sha = hashlib.sha1()
+    with open(path, 'rb') as fobj:
+        for chunk in iter(lambda: fobj.read(2 ** 16), b''):
+            sha.update(chunk)
+    return (path, sha.hexdigest())
+
+
+class ResultCache(object):
+    """ Least-recently-used cache of command results, with optional disk tier
+
+    Results are stored pickled, and each ``get`` returns a new copy of the
+    stored result.  Results that cannot be pickled are not stored.
+
+    Examples
+    --------
+    >>> cache = ResultCache(maxsize=2)
+    >>> key = cache.key(('ls', '-l'))
+    >>> cache.set(key, ['result'])
+    True
+    >>> cache.get(key)
+    ['result']
+    >>> cache.get(cache.key(('ls',))) is None
+    True
+    """
+    def __init__(self, maxsize=128, directory=None, hash_contents=False):
+        """ Initialize cache
+
+        Parameters
+        ----------
+        maxsize : int, optional
+            maximum number of results to keep in memory
+        directory : None or str, optional
+            If not None, also store results as files in this directory, and
+            look for results there when they are not in memory
+        hash_contents : {False, True}, optional
+            If True, identify input files by hash of their contents, otherwise
+            by size and modification time
+        """
+        self.maxsize = maxsize
+        self.directory = directory
+        self.hash_contents = hash_contents
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def key(self, cmdline, input_files=()):
+        """ Return key for command line `cmdline` with input files
+
+        Parameters
+        ----------
+        cmdline : sequence
+            command line sequence
+        input_files : sequence, optional
+            filenames of inputs to command
+
+        Returns
+        -------
+        key : str
+            hex digest identifying command line and state of input files
+        """
+        signature = (tuple(cmdline),
+                     tuple(file_signature(path, self.hash_contents)
+                           for path in input_files))
+        return hashlib.sha1(repr(signature).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """ Return copy of result stored for `key`, or None if not stored """
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is None and self.directory is not None:
+            try:
+                with open(self._path(key), 'rb') as fobj:
+                    data = fobj.read()
+            except (IOError, OSError):
+                return None
+            self._remember(key, data)
+        if data is None:
+            return None
+        return pickle.loads(data)
+
+    def set(self, key, result):
+        """ Store `result` for `key`, return True if stored """
+        try:
+            data = pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return False
+        self._remember(key, data)
+        if self.directory is not None:
+            # Write to temporary file and rename, to avoid partial results
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'wb') as fobj:
+                fobj.write(data)
+            os.replace(tmp_path, self._path(key))
+        return True
+
+    def clear(self):
+        """ Remove all results from memory """
+        with self._lock:
+            self._memory.clear()
+
+    def __len__(self):
+        return len(self._memory)
+
+    def _remember(self, key, data):
+        with self._lock:
+            self._memory[key] = data
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.maxsize:
+                self._memory.popitem(last=False)
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
@@ -48,6 +48,11 @@ class PositionalContainer(object):
         keys = self.keys()
         if len(set(keys)) < len(keys):
             raise ValueError('Duplicate names or aliases in parameters')
+        # map of name or alias to index, for constant time lookup
+        self._key_indices = {}
+        for i, pdef in enumerate(positional_defines):
+            for key in pdef.keys():
+                self._key_indices[key] = i
 
     @property
     def positional_defines(self):
@@ -93,12 +98,23 @@ class PositionalContainer(object):
 
         Examples
         --------
-        >>>
+        >>> from caller import Positional
+        >>> pc = PositionalContainer((Positional('param1', ['p1']),))
+        >>> pc.index('p1')
+        0
         '''
-        for i, pdef in enumerate(self._positional_defines):
-            if key in pdef.keys():
-                return i
-        raise ValueError('"%s" not in container' % key)
+        try:
+            return self._key_indices[key]
+        except KeyError:
+            raise ValueError('"%s" not in container' % key)
+
+    @property
+    def key_indices(self):
+        """ Mapping of all names, aliases to index of positional define
+
+        Do not modify the returned mapping.
+        """
+        return self._key_indices
 
 
 class ParameterDefinitions(object):
@@ -116,7 +132,9 @@ class ParameterDefinitions(object):
     The API consists of:
 
     * a, b = obj.checked_values(positionals, named)
-    * cmd_str = obj.make_command(cmd, positionals, named)
+    * cmd_str = obj.make_cmdline(cmd, positionals, named)
+    * template = obj.compile(cmd)
+    * cmd_str = template.render(positionals, named)
 
     """
     def __init__(self,
@@ -161,6 +179,11 @@ class ParameterDefinitions(object):
                                      % (key, odef.name))
                 named_dict[key] = odef
         self._named_dict = named_dict
+        # classify each key as positional (with index) or option (index None)
+        key_indices = self._pos_container.key_indices
+        self._key_map = dict((key, (key_indices.get(key), ndef))
+                             for key, ndef in named_dict.items())
+        self._templates = {}
 
     @property
     def positional_defines(self):
@@ -209,46 +232,85 @@ class ParameterDefinitions(object):
         if named is None:
             named = {}
         # first process named, pulling out any positional
-        posdefs = self._pos_container
+        key_map = self._key_map
         options = {}
         named_poses = []
         # check named, and remove positionals
         for key, value in named.items():
             try:
-                pos_ind = posdefs.index(key)
-            except ValueError:
-                pass
-            else:
+                pos_ind, ndef = key_map[key]
+            except KeyError:
+                raise CallerError('Strange key "%s" in named parameters'
+                                  % key)
+            if pos_ind is not None:
                 named_poses.append((pos_ind, value))
                 continue
-            if not key in self._named_dict:
-                raise CallerError('Strange key "%s" in named parameters'
-                                 % key)
-            ndef = self._named_dict[key]
             # make name canonical for option
             options[ndef.name] = ndef.checker(value)
-        # put any named positionals into positionals list
-        named_poses.sort(key = lambda x: x[0])
         positionals = list(positionals)
-        for i, val in named_poses:
-            if i < len(positionals):
-                positionals[i] = val
-                continue
-            if i == len(positionals):
-                positionals.append(val)
-            else:
-                raise CallerError('Named positional too far from end '
-                                  'of positional list')
+        if named_poses:
+            # put any named positionals into positionals list
+            named_poses.sort(key = lambda x: x[0])
+            for i, val in named_poses:
+                if i < len(positionals):
+                    positionals[i] = val
+                    continue
+                if i == len(positionals):
+                    positionals.append(val)
+                else:
+                    raise CallerError('Named positional too far from end '
+                                      'of positional list')
         # check positionals
-        pdef_iter = posdefs.gen_defines()
-        poses = []
-        for value in positionals:
-            try:
-                pdef = next(pdef_iter)
-            except StopIteration:
+        pos_defs = self._positional_defines
+        n_defs = len(pos_defs)
+        if len(positionals) > n_defs:
+            if not (self._pos_container.last_repeat and n_defs):
                 raise CallerError('Too many positional parameters')
-            poses.append(pdef.checker(value))
-        return tuple(poses), options
+            pos_defs = (tuple(pos_defs) +
+                        (pos_defs[-1],) * (len(positionals) - n_defs))
+        poses = tuple([pdef.checker(value)
+                       for pdef, value in zip(pos_defs, positionals)])
+        return poses, options
+
+    def file_values(self, positionals=(), options=None, param_type='input'):
+        ''' Return values of file parameters of type `param_type`
+
+        Parameters
+        ----------
+        positionals : sequence, optional
+           checked values for positional parameters
+        options : None or mapping, optional
+           checked values for options, keyed by canonical name.  If None,
+           empty mapping
+        param_type : str, optional
+           type of file parameter, usually 'input' or 'output'
+
+        Returns
+        -------
+        values : list
+           values (filenames) of parameters with 'file' and `param_type` in
+           their ``param_types``, positionals first.
+
+        Examples
+        --------
+        >>> from caller import Positional, Option
+        >>> pd = ParameterDefinitions(
+        ...     (Positional('infile', param_types=('input', 'file')),
+        ...      Positional('outfile', param_types=('output', 'file'))))
+        >>> pd.file_values(('in.nii', 'out.nii'), param_type='output')
+        ['out.nii']
+        '''
+        if options is None:
+            options = {}
+        values = []
+        pdef_iter = self._pos_container.gen_defines()
+        for value in positionals:
+            if next(pdef_iter).is_file(param_type):
+                values.append(value)
+        for key, value in options.items():
+            if self._named_dict[key].is_file(param_type):
+                values.append(value)
+        return values
 
     def make_cmdline(self, cmd, positionals=(), named=None, checked=False):
         ''' Make command line sequence from input `cmd` and parameters
@@ -271,32 +333,222 @@ class ParameterDefinitions(object):
         cmdline : tuple
            command line tuple
         '''
+        return self.compile(cmd).render(positionals, named, checked)
+
+    def make_cmdlines(self, cmd, rows):
+        ''' Make command line sequences for columnar batch of values `rows`
+
+        Parameters
+        ----------
+        cmd : sequence
+           command sequence
+        rows : mapping or structured array
+           mapping with keys being parameter names, and values being
+           equal-length sequences (or arrays) of values for that parameter,
+           one per command line.  Keys can be options or named positionals.
+           Can also be a numpy structured array, with field names being
+           parameter names.
+
+        Returns
+        -------
+        cmdlines : list
+           list of command line tuples, one per row of `rows`
+
+        Examples
+        --------
+        >>> from caller import Positional, Option
+        >>> pd = ParameterDefinitions((Positional('param1'),),
+        ...                           (Option('option1'),))
+        >>> pd.make_cmdlines('cmd', {'param1': ['a', 'b'], 'option1': [1, 2]})
+        [('cmd', '--option1=1', 'a'), ('cmd', '--option1=2', 'b')]
+        '''
+        return self.compile(cmd).render_many(rows)
+
+    def compile(self, cmd):
+        ''' Return precompiled command line template for command `cmd`
+
+        Templates are cached by `cmd`, and reflect the parameter defines as
+        they were when first compiled.
+
+        Parameters
+        ----------
+        cmd : str or sequence
+           command sequence
+
+        Returns
+        -------
+        template : ``CmdlineTemplate`` instance
+           template with method ``render(positionals, named, checked)``
+           returning the command line tuple, as for ``make_cmdline``
+
+        Examples
+        --------
+        >>> from caller import Positional, Option
+        >>> pd = ParameterDefinitions((Positional('param1'),),
+        ...                           (Option('option1'),))
+        >>> template = pd.compile('cmd')
+        >>> template.render(('a1',), {'option1': 2})
+        ('cmd', '--option1=2', 'a1')
+        >>> pd.compile(['cmd']) is template
+        True
+        '''
         if isinstance(cmd, string_types):
-            cmd = [cmd]
+            cmd = (cmd,)
         else:
-            cmd = list(cmd)
-        if named is None:
-            named = {}
-        if not checked:
-            positionals, named = self.checked_values(positionals, named)
-        # check that required arguments are present
-        for i, pdef in enumerate(self._positional_defines):
-            if pdef.is_required and i >= len(positionals):
-                raise CallerError('Not enough positional arguments')
-        for odef in self._option_defines:
-            if odef.is_required and odef.name not in named:
-                raise CallerError('Expecting required option "%s"'
-                                  % odef.name)
-        pdef_iter = self._pos_container.gen_defines()
-        pos_strs = []
-        for value in positionals:
-            pdef = next(pdef_iter)
-            pos_strs.append(pdef.to_string(value))
-        named_strs =  []
-        for key, value in named.items():
-            ndef = self._named_dict[key]
-            named_strs.append(ndef.to_string(value))
-        return self._compile(cmd, pos_strs, named_strs)
+            cmd = tuple(cmd)
+        try:
+            return self._templates[cmd]
+        except KeyError:
+            pass
+        template = CmdlineTemplate(self, cmd)
+        self._templates[cmd] = template
+        return template
 
     def _compile(self, cmd, pos_strs, named_strs):
         return tuple(cmd + named_strs + pos_strs)
+
+
+class CmdlineTemplate(object):
+    """ Command line template precompiled from parameter definitions
+
+    Use ``ParameterDefinitions.compile`` to make templates.  The template
+    stores the command, the checks for required parameters, and the stringer
+    for each positional slot and named parameter, so rendering a command line
+    needs a single pass over the values.
+    """
+    def __init__(self, param_defs, cmd):
+        """ Initialize template
+
+        Parameters
+        ----------
+        param_defs : ``ParameterDefinitions`` instance
+        cmd : tuple
+           command sequence
+        """
+        self.cmd = cmd
+        self._cmd_list = list(cmd)
+        self._param_defs = param_defs
+        pos_defs = param_defs.positional_defines
+        # Number of positionals needed to cover all required positionals
+        self.n_required = 0
+        for i, pdef in enumerate(pos_defs):
+            if pdef.is_required:
+                self.n_required = i + 1
+        self.required_options = tuple(odef.name
+                                      for odef in param_defs.option_defines
+                                      if odef.is_required)
+        self._pos_stringers = tuple(pdef.to_string for pdef in pos_defs)
+        if param_defs._last_pos_repeat and len(pos_defs):
+            self._repeat_stringer = pos_defs[-1].to_string
+        else:
+            self._repeat_stringer = None
+        self._named_stringers = dict(
+            (key, ndef.to_string)
+            for key, ndef in param_defs._named_dict.items())
+        self._join = param_defs._compile
+
+    def render(self, positionals=(), named=None, checked=False):
+        ''' Render command line tuple from parameters
+
+        Parameters
+        ----------
+        positionals : sequence, optional
+           sequence of positional argument values
+        named : None or mapping, optional
+           key, value pairs of named arguememts, either options, or
+           named positional. If None, empty mapping.
+        checked: {False, True}, optional
+           True if `positionals` and `named` have already been checked
+           and sorted into positional and option args.
+
+        Returns
+        -------
+        cmdline : tuple
+           command line tuple
+        '''
+        if named is None:
+            named = {}
+        if not checked:
+            positionals, named = self._param_defs.checked_values(positionals,
+                                                                 named)
+        n_pos = len(positionals)
+        if n_pos < self.n_required:
+            raise CallerError('Not enough positional arguments')
+        for name in self.required_options:
+            if name not in named:
+                raise CallerError('Expecting required option "%s"' % name)
+        stringers = self._pos_stringers
+        if n_pos > len(stringers):
+            if self._repeat_stringer is None:
+                raise CallerError('Too many positional parameters')
+            stringers = (stringers +
+                         (self._repeat_stringer,) * (n_pos - len(stringers)))
+        pos_strs = [stringer(value)
+                    for stringer, value in zip(stringers, positionals)]
+        named_stringers = self._named_stringers
+        named_strs = [named_stringers[key](value)
+                      for key, value in named.items()]
+        return self._join(self._cmd_list, pos_strs, named_strs)
+
+    def render_many(self, rows):
+        ''' Render command line tuples for columnar batch of values `rows`
+
+        See ``ParameterDefinitions.make_cmdlines`` for parameters.
+
+        Names in `rows` are resolved once for the whole batch, and values are
+        checked and converted to strings column by column.
+        '''
+        param_defs = self._param_defs
+        field_names = getattr(getattr(rows, 'dtype', None), 'names', None)
+        if field_names is not None: # numpy structured array
+            columns = [(name, rows[name]) for name in field_names]
+        else:
+            columns = list(rows.items())
+        n_rows = None
+        pos_columns = {}
+        named_columns = {}
+        for key, values in columns:
+            if hasattr(values, 'tolist'): # numpy array to Python scalars
+                values = values.tolist()
+            else:
+                values = list(values)
+            if n_rows is None:
+                n_rows = len(values)
+            elif len(values) != n_rows:
+                raise CallerError(
+                    'Values for "%s" have length %d; expecting %d'
+                    % (key, len(values), n_rows))
+            try:
+                pos_ind, ndef = param_defs._key_map[key]
+            except KeyError:
+                raise CallerError('Strange key "%s" in named parameters'
+                                  % key)
+            if pos_ind is None:
+                named_columns[ndef.name] = (ndef, values)
+            else:
+                pos_columns[pos_ind] = (ndef, values)
+        if n_rows is None:
+            n_rows = 0
+        n_pos = len(pos_columns)
+        if sorted(pos_columns) != list(range(n_pos)):
+            raise CallerError('Named positional too far from end '
+                              'of positional list')
+        if n_pos < self.n_required:
+            raise CallerError('Not enough positional arguments')
+        for name in self.required_options:
+            if name not in named_columns:
+                raise CallerError('Expecting required option "%s"' % name)
+        # Check and convert to strings, column by column
+        str_columns = []
+        for ndef, values in ([named_columns[name] for name in named_columns] +
+                             [pos_columns[i] for i in range(n_pos)]):
+            str_columns.append(list(map(ndef.to_string,
+                                        map(ndef.checker, values))))
+        n_named = len(named_columns)
+        cmd_list = self._cmd_list
+        join = self._join
+        cmdlines = []
+        for row in zip(*str_columns) if str_columns else [()] * n_rows:
+            row = list(row)
+            cmdlines.append(join(cmd_list, row[n_named:], row[:n_named]))
+        return cmdlines
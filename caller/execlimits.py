@@ -0,0 +1,85 @@
+""" Set limits for this process, then replace it with a command
+
+Run as::
+
+    python -I -S execlimits.py [--rlimit=RES:SOFT:HARD ...] [--nice=N]
+        [--cpus=CPU,CPU,...] -- command [arg ...]
+
+where ``RES`` is a ``resource.RLIMIT_*`` number.  The limits are in place
+before the command starts, and processes the command starts inherit them.
+``ShellWrapper`` runs commands with resource limits, niceness or CPU affinity
+through this module, so it can set the limits without running code in a
+forked child before ``exec``.
+
+The module only imports from the standard library, so it can run with
+``python -I -S``.  Errors setting limits, or starting the command, exit with
+code 126, or 127 for a command that does not exist, as for the shell.
+"""
+
+import os
+import sys
+import signal
+
+
+def parse_args(args):
+    """ Return rlimits, nice, cpus, command from command line `args`
+
+    rlimits is a list of (resource, (soft, hard)), `nice` is None or an
+    int, `cpus` is None or a set of ints, and `command` is a list of
+    strings.
+    """
+    rlimits, nice, cpus = [], None, None
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if arg == '--':
+            break
+        name, _, value = arg.partition('=')
+        if name == '--rlimit':
+            key, soft, hard = [int(v) for v in value.split(':')]
+            rlimits.append((key, (soft, hard)))
+        elif name == '--nice':
+            nice = int(value)
+        elif name == '--cpus':
+            cpus = set(int(v) for v in value.split(','))
+        else:
+            raise ValueError('Unknown option "%s"' % arg)
+    if not args:
+        raise ValueError('No command')
+    return rlimits, nice, cpus, args
+
+
+def set_limits(rlimits, nice=None, cpus=None):
+    """ Set limits for this process """
+    if rlimits:
+        import resource
+        for key, limit in rlimits:
+            resource.setrlimit(key, limit)
+    if nice:
+        os.nice(nice)
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+
+
+def main(args=None):
+    if args is None:
+        args = sys.argv[1:]
+    try:
+        rlimits, nice, cpus, command = parse_args(args)
+        set_limits(rlimits, nice, cpus)
+    except (ValueError, OSError) as exc:
+        sys.stderr.write('execlimits: %s\n' % exc)
+        sys.exit(126)
+    # Python ignores these; restore the defaults for the command
+    for name in ('SIGPIPE', 'SIGXFZ', 'SIGXFSZ'):
+        if hasattr(signal, name):
+            signal.signal(getattr(signal, name), signal.SIG_DFL)
+    try:
+        os.execvp(command[0], command)
+    except OSError as exc:
+        sys.stderr.write('execlimits: %s: %s\n' % (command[0], exc))
+        sys.exit(127 if isinstance(exc, FileNotFoundError) else 126)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+""" Client for launcher server process starting wrapped commands
+
+Starting a command from a large parent process is slow, because of the
+work to copy, or set up, the memory of the parent.  A ``Launcher`` starts a
+small server process once, and then sends each command to the server, to
+start from there.  Set the ``launcher`` attribute of a ``ShellWrapper`` to
+route its commands through the launcher.
+
+For commands that run Python scripts, a ``ScriptWorker`` keeps the script
+loaded in a persistent worker process, to avoid interpreter startup and
+imports for each command.
+"""
+
+import os
+import sys
+import itertools
+import threading
+import subprocess
+from concurrent import futures
+
+from .defines import CallerError
+from . import launchserver
+from .launchserver import send_message, recv_message
+
+
+class Launcher(object):
+    """ Start commands from a lightweight server process
+
+    The server process starts on the first call to ``execute``, and restarts
+    if it has exited.  Calls to ``execute`` from different threads run
+    concurrently.  Commands run in the working directory, and with the
+    environment, of this process at the time of the call, with empty input
+    on stdin.
+
+    Examples
+    --------
+    >>> import sys
+    >>> launcher = Launcher()
+    >>> code, out, err = launcher.execute([sys.executable, '-c', 'print(1)'])
+    >>> code, out.strip() == b'1'
+    (0, True)
+    >>> launcher.close()
+    """
+    def __init__(self, python=None):
+        """ Initialize launcher
+
+        Parameters
+        ----------
+        python : None or str, optional
+            Python executable to run server.  If None, use ``sys.executable``
+        """
+        if python is None:
+            python = sys.executable
+        self.python = python
+        self._server = None
+        self._server_env = None
+        self._pending = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """ Start server process if not running """
+        with self._lock:
+            self._start()
+
+    def _start(self):
+        # Start server if not running; call with lock held
+        if self._server is not None and self._server.poll() is None:
+            return
+        self._server_env = dict(os.environ)
+        self._server = subprocess.Popen(
+            self._server_cmd(),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=self._server_env)
+        # Commands waiting for replies from this server
+        self._pending = {}
+        reader = threading.Thread(target=self._read_replies,
+                                  args=(self._server, self._pending))
+        reader.daemon = True
+        reader.start()
+
+    def _server_cmd(self):
+        """ Return command line to start server """
+        return [self.python, '-I', '-S', launchserver.__file__]
+
+    def execute(self, cmd, shell=False):
+        """ Run command `cmd` in server, return result code and output
+
+        Parameters
+        ----------
+        cmd : sequence
+            command line sequence
+        shell : {False, True}, optional
+            whether to run command through shell
+
+        Returns
+        -------
+        result_code : int
+        stdout : bytes
+        stderr : bytes
+        """
+        job = futures.Future()
+        cwd = os.getcwd()
+        env = dict(os.environ)
+        with self._lock:
+            # Server and reader are running while we hold the lock, so the
+            # reader will give the job a result
+            self._start()
+            # Only send environment if changed since server started
+            if env == self._server_env:
+                env = None
+            job_id = next(self._job_ids)
+            self._pending[job_id] = job
+            try:
+                send_message(self._server.stdin,
+                             (job_id, list(cmd), shell, cwd, env))
+            except (IOError, OSError):
+                del self._pending[job_id]
+                raise CallerError('Launcher server is not accepting commands')
+        return job.result()
+
+    def close(self):
+        """ Stop server process, after running commands finish """
+        with self._lock:
+            server, self._server = self._server, None
+        if server is None:
+            return
+        server.stdin.close()
+        server.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _read_replies(self, server, pending):
+        error = CallerError('Launcher server exited')
+        try:
+            while True:
+                message = recv_message(server.stdout)
+                if message is None:
+                    break
+                job_id, result_code, out, err, exc = message
+                with self._lock:
+                    job = pending.pop(job_id)
+                if exc is None:
+                    job.set_result((result_code, out, err))
+                else:
+                    job.set_exception(exc)
+        except Exception as exc:
+            # Unreadable reply, or reply for unknown job; the replies can no
+            # longer be matched to commands, so stop this server
+            error = CallerError('Bad reply from launcher server: %r' % exc)
+            server.kill()
+        server.stdout.close()
+        # Server has gone; fail any commands still waiting, and make the
+        # next command start a new server
+        with self._lock:
+            if self._server is server:
+                self._server = None
+                server.stdin.close()
+            jobs = list(pending.values())
+            pending.clear()
+        for job in jobs:
+            job.set_exception(error)
+        server.wait()
+
+
+class ScriptWorker(Launcher):
+    """ Run commands for a Python script in a persistent worker process
+
+    The worker process loads and compiles the script once.  For each command
+    ``(python, script, arg1, ...)``, the worker runs the script as
+    ``__main__`` with ``sys.argv`` of ``[script, arg1, ...]``, so modules the
+    script imports stay loaded between commands.  ``SystemExit`` gives the
+    result code.
+
+    Only output written to ``sys.stdout`` and ``sys.stderr`` from Python is
+    captured.  Other output, such as from commands the script runs, goes to
+    the stderr of the worker, and ``sys.stdin`` is empty.  Commands run one
+    at a time; use more than one worker to run commands in parallel.
+
+    Examples
+    --------
+    >>> import sys
+    >>> from caller import ShellWrapper
+    >>> class App(ShellWrapper):
+    ...     cmd = (sys.executable, 'app.py')
+    ...     launcher = ScriptWorker('app.py')
+    """
+    def __init__(self, script, python=None):
+        """ Initialize worker
+
+        Parameters
+        ----------
+        script : str
+            filename of Python script, relative to the current directory.
+            Script filenames in commands are relative to the working
+            directory at the time of the command.
+        python : None or str, optional
+            Python executable to run worker.  If None, use ``sys.executable``
+        """
+        super(ScriptWorker, self).__init__(python)
+        self.script = os.path.abspath(script)
+
+    def _server_cmd(self):
+        return [self.python, launchserver.__file__, '--script', self.script]
@@ -0,0 +1,217 @@
+""" Server process starting commands on behalf of a parent process
+
+Run as a script, the server reads requests from stdin, runs each requested
+command in a thread, and writes the result to stdout.  The server is a small
+process, so it can start commands faster than a large parent process.  See
+:class:`caller.launcher.Launcher` for the client.
+
+The module only imports from the standard library, so the server can run
+with ``python -I -S``.
+
+Run as ``launchserver.py --script <script.py>``, the server is a persistent
+worker for a Python script.  It compiles the script once, then runs each
+request in-process, with ``sys.argv`` set from the command, and Python-level
+``sys.stdout`` and ``sys.stderr`` captured.  Other output, such as from
+commands the script runs, goes to the stderr of the server.  See
+:class:`caller.launcher.ScriptWorker` for the client.
+
+Messages are pickled tuples, each preceded by their length as a 4-byte
+unsigned big-endian integer.  Requests are ``(job_id, cmd, shell, cwd,
+env)``, where ``cwd`` is the working directory for the command, and ``env``
+is None, for the environment of the server at startup, or a dict of
+environment variables.  Replies are ``(job_id, result_code, stdout,
+stderr, exception)``, where ``exception`` is None, or the exception raised
+when starting the command.
+"""
+
+import os
+import io
+import sys
+import pickle
+import struct
+import subprocess
+import threading
+import traceback
+
+_HEADER = struct.Struct('>I')
+
+
+def send_message(fobj, message):
+    """ Write pickled `message` with length header to file `fobj` """
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    fobj.write(_HEADER.pack(len(data)) + data)
+    fobj.flush()
+
+
+def _read_exactly(fobj, n_bytes):
+    data = b''
+    while len(data) < n_bytes:
+        chunk = fobj.read(n_bytes - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def recv_message(fobj):
+    """ Read message from file `fobj`, return None at end of file """
+    header = _read_exactly(fobj, _HEADER.size)
+    if header is None:
+        return None
+    data = _read_exactly(fobj, _HEADER.unpack(header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+def run_job(job_id, cmd, shell, cwd=None, env=None):
+    """ Run `cmd` in `cwd` with environment `env`, return reply message
+
+    The command gets empty input; the stdin of the server is the request
+    pipe.
+    """
+    try:
+        child = subprocess.Popen(cmd,
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE,
+                                 shell=shell,
+                                 cwd=cwd,
+                                 env=env)
+        (out, err) = child.communicate()
+    except Exception as exc:
+        return (job_id, None, b'', b'', exc)
+    return (job_id, child.returncode, out, err, None)
+
+
+def serve(infile, outfile):
+    """ Serve requests from `infile`, writing replies to `outfile`
+
+    Returns when `infile` reaches end of file, after all jobs finish.
+    """
+    lock = threading.Lock()
+
+    def reply(job_id, cmd, shell, cwd=None, env=None):
+        message = run_job(job_id, cmd, shell, cwd, env)
+        with lock:
+            send_message(outfile, message)
+
+    threads = []
+    while True:
+        message = recv_message(infile)
+        if message is None:
+            break
+        thread = threading.Thread(target=reply, args=message)
+        thread.start()
+        threads.append(thread)
+        threads = [t for t in threads if t.is_alive()]
+    for thread in threads:
+        thread.join()
+
+
+def _exit_code(exc):
+    """ Return result code for ``SystemExit`` `exc`, as for interpreter """
+    if exc.code is None:
+        return 0
+    if isinstance(exc.code, int):
+        return exc.code
+    sys.stderr.write('%s\n' % exc.code)
+    return 1
+
+
+def _set_environ(env):
+    """ Set ``os.environ`` to match dict `env` """
+    if os.environ == env:
+        return
+    for key in set(os.environ).difference(env):
+        del os.environ[key]
+    os.environ.update(env)
+
+
+def run_script(code, script, job_id, cmd, cwd=None, env=None):
+    """ Run compiled `code` of `script` for command `cmd`, return reply
+
+    The command runs in directory `cwd`, if not None, and with environment
+    `env`, if not None.  Relative paths in `cmd` are relative to `cwd`.
+    """
+    if cwd is None:
+        cwd = os.getcwd()
+    if (len(cmd) < 2 or
+        os.path.abspath(os.path.join(cwd, cmd[1])) != script):
+        exc = ValueError('Worker runs "%s"; command is %s' % (script, cmd))
+        return (job_id, None, b'', b'', exc)
+    try:
+        os.chdir(cwd)
+    except OSError as exc:
+        return (job_id, None, b'', b'', exc)
+    if env is not None:
+        _set_environ(env)
+    out, err = io.BytesIO(), io.BytesIO()
+    # Keep references to wrappers; they close their buffers when deleted
+    out_text = io.TextIOWrapper(out, write_through=True)
+    err_text = io.TextIOWrapper(err, write_through=True)
+    sys_state = sys.argv, sys.stdout, sys.stderr
+    sys.argv = list(cmd[1:])
+    sys.stdout, sys.stderr = out_text, err_text
+    result_code = 0
+    try:
+        exec(code, {'__name__': '__main__',
+                    '__file__': script,
+                    '__builtins__': __builtins__})
+    except SystemExit as exc:
+        result_code = _exit_code(exc)
+    except BaseException:
+        traceback.print_exc()
+        result_code = 1
+    finally:
+        sys.argv, sys.stdout, sys.stderr = sys_state
+    out_text.flush()
+    err_text.flush()
+    return (job_id, result_code, out.getvalue(), err.getvalue(), None)
+
+
+def serve_script(script, infile, outfile):
+    """ Serve requests to run Python `script` from `infile` to `outfile`
+
+    Requests run one at a time.  Returns when `infile` reaches end of file.
+    """
+    with open(script, 'rb') as fobj:
+        code = compile(fobj.read(), script, 'exec')
+    server_env = dict(os.environ)
+    while True:
+        message = recv_message(infile)
+        if message is None:
+            break
+        job_id, cmd, shell, cwd, env = message
+        # Restore environment from any previous request
+        env = server_env if env is None else env
+        send_message(outfile, run_script(code, script, job_id, cmd, cwd, env))
+
+
+def _private_pipes():
+    """ Move request and reply pipes from stdin and stdout to private fds
+
+    Returns files for requests and replies.  Afterwards, file descriptor 0
+    reads from the null device, and file descriptor 1 writes to stderr, so
+    output written to file descriptors, such as output from commands a
+    script runs, cannot reach the reply pipe.  The duplicated descriptors
+    are not inheritable, so commands do not get them.
+    """
+    infile = os.fdopen(os.dup(0), 'rb')
+    outfile = os.fdopen(os.dup(1), 'wb')
+    null_fd = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(null_fd, 0)
+    os.close(null_fd)
+    os.dup2(2, 1)
+    return infile, outfile
+
+
+if __name__ == '__main__':
+    if sys.argv[1:2] == ['--script']:
+        script = os.path.abspath(sys.argv[2])
+        # Import path as for running the script directly
+        sys.path[0] = os.path.dirname(script)
+        infile, outfile = _private_pipes()
+        serve_script(script, infile, outfile)
+    else:
+        serve(sys.stdin.buffer, sys.stdout.buffer)
@@ -0,0 +1,143 @@
+""" Manifests recording successful runs, to skip runs that are up to date
+
+As for ``make``, a job is up to date if its output files are newer than its
+input files.  The manifest also records the command line and the state of
+the input and output files at the last successful run.  A job is up to date
+only if the command line is the same, and the input and output files have
+not changed since that run.
+
+Jobs are identified by their output files, so jobs without output files are
+never up to date.
+"""
+
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+from .cache import file_signature
+
+
+def _cmdline_hash(cmdline):
+    return hashlib.sha1(repr(tuple(cmdline)).encode('utf-8')).hexdigest()
+
+
+def _file_stats(paths):
+    """ Return mapping of path to [size, mtime_ns] or None if any missing """
+    stats = {}
+    for path in paths:
+        try:
+            stats[path] = list(file_signature(path)[1:])
+        except OSError:
+            return None
+    return stats
+
+
+class Manifest(object):
+    """ Record of successful runs, keyed by output files
+
+    Examples
+    --------
+    >>> manifest = Manifest()
+    >>> manifest.is_current(('cmd', 'out.txt'), [], ['out.txt'])
+    False
+    """
+    def __init__(self, filename=None):
+        """ Initialize manifest
+
+        Parameters
+        ----------
+        filename : None or str, optional
+            JSON file to load and save manifest.  If None, manifest is only
+            in memory.  The manifest loads from `filename` if it exists.
+        """
+        self.filename = filename
+        self._entries = {}
+        self._lock = threading.Lock()
+        if filename is not None and os.path.exists(filename):
+            with open(filename, 'rt') as fobj:
+                self._entries = json.load(fobj)
+
+    def _key(self, outputs):
+        return json.dumps(sorted(os.path.abspath(path) for path in outputs))
+
+    def is_current(self, cmdline, inputs, outputs):
+        """ True if job with `cmdline`, `inputs`, `outputs` is up to date
+
+        Parameters
+        ----------
+        cmdline : sequence
+            command line sequence
+        inputs : sequence
+            filenames of input files
+        outputs : sequence
+            filenames of output files
+
+        Returns
+        -------
+        tf : bool
+            True if there is a recorded run for these outputs with the same
+            command line, the input and output files are unchanged since that
+            run, and the output files are no older than the input files.
+        """
+        if not outputs:
+            return False
+        with self._lock:
+            entry = self._entries.get(self._key(outputs))
+        if entry is None or entry['cmdline'] != _cmdline_hash(cmdline):
+            return False
+        input_stats = _file_stats(inputs)
+        output_stats = _file_stats(outputs)
+        if (input_stats is None or output_stats is None or
+            input_stats != entry['inputs'] or
+            output_stats != entry['outputs']):
+            return False
+        if not input_stats:
+            return True
+        newest_input = max(mtime for size, mtime in input_stats.values())
+        oldest_output = min(mtime for size, mtime in output_stats.values())
+        return oldest_output >= newest_input
+
+    def record(self, cmdline, inputs, outputs):
+        """ Record successful run of job with `cmdline`, `inputs`, `outputs`
+
+        Does nothing if there are no `outputs`, or if any files are missing.
+        """
+        if not outputs:
+            return
+        input_stats = _file_stats(inputs)
+        output_stats = _file_stats(outputs)
+        if input_stats is None or output_stats is None:
+            return
+        with self._lock:
+            self._entries[self._key(outputs)] = {
+                'cmdline': _cmdline_hash(cmdline),
+                'inputs': input_stats,
+                'outputs': output_stats}
+
+    def save(self, filename=None):
+        """ Save manifest as JSON to `filename` or ``self.filename``
+        """
+        if filename is None:
+            filename = self.filename
+        if filename is None:
+            raise ValueError('Need filename to save manifest')
+        with self._lock:
+            data = json.dumps(self._entries)
+        # Write to temporary file and rename, to avoid partial manifests
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(filename)))
+        with os.fdopen(fd, 'wt') as fobj:
+            fobj.write(data)
+        os.replace(tmp_path, filename)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.filename is not None:
+            self.save()
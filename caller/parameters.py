@@ -5,6 +5,10 @@ string_types = (str,) if sys.version_info[0] > 2 else (basestring,)
 class Parameter(object):
     """ Class implementing positional and named parameters
 
+    ``param_types`` is a sequence of strings describing the parameter, such as
+    'input', 'output', 'file'.  A parameter with types 'input' and 'file' has
+    a value that is the filename of an input file to the command.
+
     Examples
     --------
     >>> param = Parameter('p',['param'],float,True)
@@ -21,7 +25,8 @@ class Parameter(object):
                  aliases=None,
                  checker=None,
                  is_required=False,
-                 stringer=None):
+                 stringer=None,
+                 param_types=None):
         self.name = name
         if not aliases:
             aliases = ()
@@ -37,6 +42,9 @@ class Parameter(object):
             fmtstr = stringer
             def stringer(value): return fmtstr % value
         self.stringer = stringer
+        if not param_types:
+            param_types = ()
+        self.param_types = tuple(param_types)
 
     def default_stringer(self, value):
         mapper = self.__dict__.copy()
@@ -46,6 +54,19 @@ class Parameter(object):
     def to_string(self, value):
         return self.stringer(self.checker(value))
 
+    def is_file(self, param_type):
+        ''' True if this is a file parameter of type `param_type`
+
+        Examples
+        --------
+        >>> param = Parameter('param', param_types=('input', 'file'))
+        >>> param.is_file('input')
+        True
+        >>> param.is_file('output')
+        False
+        '''
+        return 'file' in self.param_types and param_type in self.param_types
+
     def keys(self):
         ''' Return name and any aliases for this parameter
 
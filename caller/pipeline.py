@@ -0,0 +1,232 @@
+""" Run wrapped commands in order of their file dependencies
+
+A job depends on another if one of its input files is an output file of the
+other.  Input and output files are the values of parameters with 'input' or
+'output', and 'file', in their ``param_types``.  Jobs that do not depend on
+each other can run in parallel.
+"""
+
+import os
+from collections import OrderedDict, deque
+from concurrent import futures
+
+from .defines import CallerError
+
+
+class PipelineError(CallerError):
+    """ Error for pipeline with failed jobs
+
+    Attributes are ``results`` - mapping of job name to result for jobs that
+    ran, or the exception raised for jobs that raised an error; ``failed`` -
+    names of jobs that failed, and ``skipped`` - names of jobs that did not
+    run because a job they depend on failed.
+    """
+    def __init__(self, message, results, failed, skipped):
+        super(PipelineError, self).__init__(message)
+        self.results = results
+        self.failed = failed
+        self.skipped = skipped
+
+
+def _file_key(path):
+    return os.path.normcase(os.path.abspath(path))
+
+
+class Pipeline(object):
+    """ Set of wrapped commands to run in order of their dependencies
+
+    Examples
+    --------
+    >>> import sys
+    >>> from caller import Positional, ParameterDefinitions, ShellWrapper
+    >>> class Copy(ShellWrapper):
+    ...     cmd = (sys.executable, '-c',
+    ...            'import sys, shutil; shutil.copy(*sys.argv[1:])')
+    ...     parameter_definitions = ParameterDefinitions(
+    ...         (Positional('infile', param_types=('input', 'file')),
+    ...          Positional('outfile', param_types=('output', 'file'))))
+    >>> pipeline = Pipeline()
+    >>> pipeline.add(Copy(('b.txt', 'c.txt')), 'second')
+    'second'
+    >>> pipeline.add(Copy(('a.txt', 'b.txt')), 'first')
+    'first'
+    >>> pipeline.order()
+    ['first', 'second']
+    """
+    def __init__(self):
+        self._jobs = OrderedDict()
+        self._after = {}
+
+    @property
+    def jobs(self):
+        """ Mapping of job name to wrapper """
+        return self._jobs
+
+    def add(self, wrapper, name=None, after=()):
+        """ Add job running `wrapper` to pipeline, return job name
+
+        Parameters
+        ----------
+        wrapper : ``AppWrapper`` instance
+            wrapper with parameters set, to run with ``wrapper.run()``
+        name : None or str, optional
+            name for job.  If None, make name from wrapper class name
+        after : sequence, optional
+            names of jobs that this job depends on, in addition to those
+            found from the input and output files
+
+        Returns
+        -------
+        name : str
+            name of job
+        """
+        if name is None:
+            name = '%s-%d' % (type(wrapper).__name__, len(self._jobs))
+        if name in self._jobs:
+            raise CallerError('Job "%s" already in pipeline' % name)
+        self._jobs[name] = wrapper
+        self._after[name] = tuple(after)
+        return name
+
+    def dependencies(self):
+        """ Return mapping of job name to set of names of jobs it depends on
+        """
+        producers = {}
+        for name, wrapper in self._jobs.items():
+            for path in wrapper.output_files():
+                key = _file_key(path)
+                if producers.get(key, name) != name:
+                    raise CallerError('Jobs "%s" and "%s" both write "%s"'
+                                      % (producers[key], name, path))
+                producers[key] = name
+        deps = {}
+        for name, wrapper in self._jobs.items():
+            job_deps = set(self._after[name])
+            for path in wrapper.input_files():
+                producer = producers.get(_file_key(path))
+                # A parameter can be both input and output for one job
+                if producer is not None and producer != name:
+                    job_deps.add(producer)
+            unknown = job_deps.difference(self._jobs)
+            if unknown:
+                raise CallerError('Job "%s" depends on unknown jobs %s'
+                                  % (name, sorted(unknown)))
+            deps[name] = job_deps
+        return deps
+
+    def order(self):
+        """ Return job names in an order where each comes after dependencies
+
+        Raises ``CallerError`` for circular dependencies.
+        """
+        return self._order(self.dependencies())
+
+    def _dependents(self, deps):
+        # Mapping of job name to names of jobs depending on it, in job order
+        dependents = OrderedDict((name, []) for name in self._jobs)
+        for name in self._jobs:
+            for dep in deps[name]:
+                dependents[dep].append(name)
+        return dependents
+
+    def _order(self, deps):
+        # Kahn's algorithm; jobs become ready when their last dependency is
+        # done
+        dependents = self._dependents(deps)
+        n_deps = dict((name, len(deps[name])) for name in self._jobs)
+        ready = deque(name for name in self._jobs if not n_deps[name])
+        ordered = []
+        while ready:
+            name = ready.popleft()
+            ordered.append(name)
+            for other in dependents[name]:
+                n_deps[other] -= 1
+                if not n_deps[other]:
+                    ready.append(other)
+        if len(ordered) < len(self._jobs):
+            cycle = [name for name in self._jobs if n_deps[name]]
+            raise CallerError('Circular dependencies between jobs %s' % cycle)
+        return ordered
+
+    def run(self, max_workers=None):
+        """ Run jobs, in parallel where possible, return results
+
+        A job fails if running raises an error, or gives a result with a
+        non-zero ``result_code``.  Jobs depending on a failed job do not
+        run.
+
+        Parameters
+        ----------
+        max_workers : None or int, optional
+            maximum number of jobs running at once.  If None, use number of
+            CPUs
+
+        Returns
+        -------
+        results : OrderedDict
+            mapping of job name to result from ``wrapper.run()``, in order
+            of completion
+
+        Raises
+        ------
+        PipelineError
+            if any jobs failed
+        """
+        deps = self.dependencies()
+        # Check for cycles before running any jobs
+        self._order(deps)
+        dependents = self._dependents(deps)
+        n_deps = dict((name, len(deps[name])) for name in self._jobs)
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        results = OrderedDict()
+        failed = []
+        skipped = []
+        seen = set()
+        ready = deque(name for name in self._jobs if not n_deps[name])
+        running = {}
+        with futures.ThreadPoolExecutor(max_workers) as executor:
+            while ready or running:
+                while ready:
+                    name = ready.popleft()
+                    job = executor.submit(self._jobs[name].run)
+                    running[job] = name
+                done, _ = futures.wait(running,
+                                       return_when=futures.FIRST_COMPLETED)
+                for job in done:
+                    name = running.pop(job)
+                    try:
+                        result = job.result()
+                    except Exception as exc:
+                        result = exc
+                        ok = False
+                    else:
+                        ok = getattr(result, 'result_code', 0) == 0
+                    results[name] = result
+                    if ok:
+                        for other in dependents[name]:
+                            n_deps[other] -= 1
+                            if not n_deps[other]:
+                                ready.append(other)
+                    else:
+                        failed.append(name)
+                        skipped += self._skip(name, dependents, seen)
+        if failed:
+            raise PipelineError('Jobs %s failed; skipped %s'
+                                % (failed, skipped),
+                                results, failed, skipped)
+        return results
+
+    def _skip(self, name, dependents, seen):
+        # Names of jobs depending, directly or not, on failed job `name`,
+        # not already in set `seen`; add these to `seen`
+        to_skip = []
+        to_check = deque(dependents[name])
+        while to_check:
+            other = to_check.popleft()
+            if other in seen:
+                continue
+            seen.add(other)
+            to_skip.append(other)
+            to_check.extend(dependents[other])
+        return to_skip
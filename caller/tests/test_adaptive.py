@@ -0,0 +1,131 @@
+''' Tests for adaptive limit on running commands '''
+
+from ..adaptive import AdaptiveLimit, memory_available, load_per_cpu
+from .test_caller import App1Wrapper
+
+from nose.tools import assert_raises, assert_equal, assert_true
+
+
+class FakeLimit(AdaptiveLimit):
+    # Limit with set memory, load, and rate of finished commands if `rate`
+    # is not None
+    memory = 0.5
+    load = 0.5
+    rate = None
+
+    def memory_available(self):
+        return self.memory
+
+    def load_per_cpu(self):
+        return self.load
+
+    def _adjust(self, rate):
+        if self.rate is not None:
+            rate = self.rate
+        super(FakeLimit, self)._adjust(rate)
+
+
+def test_system_state():
+    memory = memory_available()
+    assert_true(memory is None or 0 <= memory <= 1)
+    load = load_per_cpu()
+    assert_true(load is None or load >= 0)
+
+
+def test_adaptive_limit():
+    assert_raises(ValueError, AdaptiveLimit, min_workers=4, start=2)
+    assert_raises(ValueError, AdaptiveLimit, max_workers=2, start=3)
+    limit = AdaptiveLimit(max_workers=6)
+    assert_true(1 <= limit.limit <= 6)
+    limit = FakeLimit(min_workers=2, max_workers=8, start=4, interval=0)
+    # Steady rate, rather than noisy rate from commands finishing at once
+    limit.rate = 10.0
+    # Idle CPUs; ramp up to maximum
+    for i in range(10):
+        limit.job_done()
+    assert_equal(limit.limit, 8)
+    # Loaded CPUs; back off one at a time
+    limit.load = 2.0
+    limit.job_done()
+    assert_equal(limit.limit, 7)
+    limit.job_done()
+    assert_equal(limit.limit, 6)
+    # Low memory; back off faster, to minimum
+    limit.memory = 0.01
+    limit.job_done()
+    assert_equal(limit.limit, 5)
+    for i in range(10):
+        limit.job_done()
+    assert_equal(limit.limit, 2)
+    # Unknown memory and load; ramp up
+    limit.memory = limit.load = None
+    limit.job_done()
+    assert_equal(limit.limit, 3)
+
+
+def test_falling_rate():
+    limit = FakeLimit(start=2, max_workers=8, hold=2)
+    limit._adjust(10.0)
+    assert_equal(limit.limit, 3)
+    # More workers, but fewer commands finishing; step back, and hold
+    limit._adjust(5.0)
+    assert_equal(limit.limit, 2)
+    for i in range(2):
+        limit._adjust(10.0)
+        assert_equal(limit.limit, 2)
+    # Try again; rate falls again, so hold for twice as long
+    limit._adjust(10.0)
+    assert_equal(limit.limit, 3)
+    limit._adjust(5.0)
+    assert_equal(limit.limit, 2)
+    for i in range(4):
+        limit._adjust(10.0)
+        assert_equal(limit.limit, 2)
+    # Rate rises with more workers; keep going up
+    limit._adjust(10.0)
+    assert_equal(limit.limit, 3)
+    limit._adjust(12.0)
+    assert_equal(limit.limit, 4)
+    # Falling again holds for `hold` intervals
+    limit._adjust(11.0)
+    assert_equal(limit.limit, 3)
+    for i in range(2):
+        limit._adjust(12.0)
+        assert_equal(limit.limit, 3)
+    limit._adjust(12.0)
+    assert_equal(limit.limit, 4)
+    # High load ends hold
+    limit._adjust(11.0)
+    assert_equal(limit.limit, 3)
+    limit.load = 2.0
+    limit._adjust(12.0)
+    assert_equal(limit.limit, 2)
+    limit.load = 0.5
+    limit._adjust(12.0)
+    assert_equal(limit.limit, 3)
+
+
+def test_converges():
+    # Rate of finished commands peaks at 3 workers
+    limit = FakeLimit(start=1, max_workers=8, hold=2)
+    limits = []
+    for i in range(200):
+        limit._adjust(10.0 - (limit.limit - 3) ** 2)
+        limits.append(limit.limit)
+    assert_true(max(limits) <= 4)
+    # Limit settles at best number of workers, trying one more worker less
+    # and less often
+    assert_true(limits[-100:].count(3) >= 95)
+    assert_true(limits[-40:].count(4) <= 1)
+
+
+def test_run_many_adaptive():
+    app1_wrapped = App1Wrapper(('arg1', 'arg2'))
+    limit = FakeLimit(max_workers=4, start=1, interval=0)
+    param_sets = [(('a%d' % i, 'b'), {}) for i in range(8)]
+    results = list(app1_wrapped.run_many(param_sets, max_workers=limit,
+                                         ordered=True))
+    assert_equal([res.stdout.read() for res in results],
+                 [b'a%d b None\n' % i for i in range(8)])
+    # Limit moves with noisy rate of finished commands
+    assert_true(1 <= limit.limit <= 4)
@@ -0,0 +1,215 @@
+''' Tests for changes to vendored argparse '''
+
+import sys
+from io import StringIO
+
+from .. import argparse
+
+from nose.tools import assert_raises, assert_equal, assert_true
+
+
+class ParserError(Exception):
+    pass
+
+
+class ErrorParser(argparse.ArgumentParser):
+    # Parser raising errors instead of exiting
+    def error(self, message):
+        raise ParserError(message)
+
+
+def _error_message(parser, args):
+    try:
+        parser.parse_args(args)
+    except ParserError as exc:
+        return str(exc)
+    raise AssertionError('No error for %s' % (args,))
+
+
+def test_option_abbreviations():
+    parser = ErrorParser()
+    # Options in non-sorted order, to check order of matches
+    parser.add_argument('--fox')
+    parser.add_argument('--foobar')
+    parser.add_argument('--foo')
+    parser.add_argument('-f', '--flag', action='store_true')
+    parser.add_argument('-xyz')
+    group = parser.add_argument_group('more')
+    group.add_argument('--zebra')
+    assert_equal(parser.parse_args(['--foob', '1']).foobar, '1')
+    assert_equal(parser.parse_args(['--foo', '1']).foo, '1')
+    assert_equal(parser.parse_args(['--fox=2']).fox, '2')
+    assert_equal(parser.parse_args(['--fl']).flag, True)
+    assert_equal(parser.parse_args(['--ze', 'z']).zebra, 'z')
+    assert_equal(parser.parse_args(['-xy', '3']).xyz, '3')
+    assert_equal(_error_message(parser, ['--fo', '1']),
+                 'ambiguous option: --fo could match --fox, --foobar, --foo')
+    assert_equal(_error_message(parser, ['--f=1']),
+                 'ambiguous option: --f=1 could match '
+                 '--fox, --foobar, --foo, --flag')
+    assert_equal(_error_message(parser, ['--nothing', '1']),
+                 'no such option: --nothing')
+    # Options added later are found
+    parser.add_argument('--fob')
+    assert_equal(parser.parse_args(['--fob', '1']).fob, '1')
+    assert_equal(_error_message(parser, ['--fo', '1']),
+                 'ambiguous option: --fo could match '
+                 '--fox, --foobar, --foo, --fob')
+
+
+def test_option_string_index():
+    index = argparse._OptionStringIndex()
+    for key in ('--b', '--ab', '--aa', '--abc'):
+        index[key] = key.upper()
+    assert_equal(index.startswith('--a'), ['--ab', '--aa', '--abc'])
+    assert_equal(index.startswith('--ab'), ['--ab', '--abc'])
+    index['--ab'] = 'new'
+    assert_equal(index.startswith('--ab'), ['--ab', '--abc'])
+    index.pop('--ab')
+    assert_equal(index.startswith('--a'), ['--aa', '--abc'])
+    index['--ab'] = 'again'
+    assert_equal(index.startswith('--a'), ['--aa', '--abc', '--ab'])
+    assert_equal(index.position('--ab'), 3)
+    assert_raises(KeyError, index.position, '--c')
+    assert_equal(index.startswith('--c'), [])
+
+
+def test_nargs_regexes():
+    parser = ErrorParser()
+    parser.add_argument('first')
+    rest = parser.add_argument('rest', nargs='*')
+    parser.add_argument('--pair', nargs=2)
+    args = parser.parse_args(['a', 'b', 'c', '--pair', 'd', 'e'])
+    assert_equal((args.first, args.rest, args.pair), ('a', ['b', 'c'],
+                                                      ['d', 'e']))
+    n_regexes = len(parser._nargs_regexes)
+    assert_equal(parser.parse_args(['x', '--pair', 'y', 'z']).rest, [])
+    assert_equal(len(parser._nargs_regexes), n_regexes)
+    assert_equal(_error_message(parser, ['a', '--pair', 'b']),
+                 'argument --pair: expected 2 argument(s)')
+    # Changing actions after parsing changes the patterns
+    rest.nargs = 2
+    assert_equal(parser.parse_args(['a', 'b', 'c']).rest, ['b', 'c'])
+    assert_equal(_error_message(parser, ['a', 'b']),
+                 'extra arguments found: b')
+
+
+def test_positional_allocation():
+    import random
+    rng = random.Random(42)
+    nargs_choices = [None, '?', '*', '+', argparse.PARSER, 0, 1, 2, 3]
+    regex = argparse.ArgumentParser(add_help=False)
+    linear = argparse.ArgumentParser(add_help=False,
+                                     positional_allocation='linear')
+    assert_equal(linear.positional_allocation, 'linear')
+    assert_raises(ValueError, argparse.ArgumentParser,
+                  positional_allocation='implausible')
+    for trial in range(2000):
+        actions = [argparse.Action([], 'dest', nargs=rng.choice(nargs_choices))
+                   for i in range(rng.randint(0, 6))]
+        if trial % 5 == 0:
+            actions[:0] = [argparse.Action(['-o'], 'o', nargs=nargs)
+                           for nargs in nargs_choices[:1]]
+        pattern = ''.join(rng.choice('AAAO-')
+                          for i in range(rng.randint(0, 12)))
+        assert_equal(linear._match_arguments_partial(actions, pattern),
+                     regex._match_arguments_partial(actions, pattern))
+    # Parsing with the linear engine
+    parser = ErrorParser(positional_allocation='linear')
+    parser.add_argument('first')
+    parser.add_argument('middle', nargs='*')
+    parser.add_argument('last', nargs=2)
+    parser.add_argument('--flag', action='store_true')
+    args = parser.parse_args(['a', 'b', 'c', 'd', 'e', '--flag'])
+    assert_equal((args.first, args.middle, args.last, args.flag),
+                 ('a', ['b', 'c'], ['d', 'e'], True))
+    args = parser.parse_args(['a', 'b', 'c'])
+    assert_equal((args.first, args.middle, args.last, args.flag),
+                 ('a', [], ['b', 'c'], False))
+    assert_equal(_error_message(parser, ['a', 'b']), 'too few arguments')
+
+
+def test_parse_many():
+    for parser_class in (argparse.ArgumentParser, ErrorParser):
+        parser = parser_class(prog='prog', version='prog 1.0')
+        parser.add_argument('first')
+        parser.add_argument('--count', type=int, default='1')
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument('--yes', action='store_true')
+        group.add_argument('--no', action='store_true')
+        stdout, stderr = sys.stdout, sys.stderr
+        sys.stdout, sys.stderr = StringIO(), StringIO()
+        try:
+            results = parser.parse_many([['a'],
+                                         ('b', '--count', '3', '--yes'),
+                                         [],
+                                         ['c', '--count', 'x'],
+                                         ['d', '--yes', '--no'],
+                                         ['e', '--nothing'],
+                                         ['-h'],
+                                         ['--version']])
+            printed = sys.stdout.getvalue() + sys.stderr.getvalue()
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+        # Nothing printed, even for help and version
+        assert_equal(printed, '')
+        assert_equal(len(results), 8)
+        assert_equal(results[0], argparse.Namespace(
+            first='a', count=1, yes=False, no=False))
+        assert_equal(results[1], argparse.Namespace(
+            first='b', count=3, yes=True, no=False))
+        errors = [str(result) for result in results[2:]]
+        assert_equal(errors[:4], [
+            'too few arguments',
+            "argument --count: invalid int value: 'x'",
+            'argument --no: not allowed with argument --yes',
+            'no such option: --nothing'])
+        assert_equal(errors[4], parser.format_help().strip())
+        assert_equal(errors[5], 'prog 1.0')
+        for result in results[2:]:
+            assert_true(isinstance(result, argparse.ArgumentError))
+    # Subparser errors are per-item errors too
+    parser = ErrorParser()
+    subparsers = parser.add_subparsers(dest='command')
+    sub = subparsers.add_parser('sub')
+    sub.add_argument('value', type=int)
+    results = parser.parse_many([['sub', '1'], ['sub', 'x'], ['other']])
+    assert_equal(results[0].value, 1)
+    assert_equal(str(results[1]), "argument value: invalid int value: 'x'")
+    assert_true(isinstance(results[2], argparse.ArgumentError))
+    # Normal parsing still goes through error
+    assert_equal(_error_message(parser, ['sub', 'x']),
+                 "argument value: invalid int value: 'x'")
+
+
+def test_memoized_formatting():
+    parser = argparse.ArgumentParser(prog='prog')
+    parser.add_argument('first')
+    usage = parser.format_usage()
+    help = parser.format_help()
+    assert_equal(usage, 'usage: prog [-h] first\n')
+    assert_true(parser.format_usage() is usage)
+    assert_true(parser.format_help() is help)
+    # Changes through parser, groups and attributes format again
+    group = parser.add_argument_group('group')
+    assert_true(parser.format_help() is not help)
+    group.add_argument('--second')
+    assert_equal(parser.format_usage(),
+                 'usage: prog [-h] [--second SECOND] first\n')
+    mutex = parser.add_mutually_exclusive_group()
+    mutex.add_argument('--yes', action='store_true')
+    mutex.add_argument('--no', action='store_true')
+    assert_equal(parser.format_usage(),
+                 'usage: prog [-h] [--second SECOND] [--yes | --no] first\n')
+    parser.prog = 'other'
+    assert_equal(parser.format_usage(),
+                 'usage: other [-h] [--second SECOND] [--yes | --no] first\n')
+    help = parser.format_help()
+    parser.set_defaults(second='default')
+    assert_true(parser.format_help() is not help)
+    parser = argparse.ArgumentParser(prog='prog')
+    subparsers = parser.add_subparsers()
+    subparsers.add_parser('sub1')
+    assert_true('{sub1}' in parser.format_usage())
+    subparsers.add_parser('sub2')
+    assert_true('{sub1,sub2}' in parser.format_usage())
@@ -0,0 +1,34 @@
+''' Tests for asyncio wrappers '''
+
+import asyncio
+
+from ..defines import CallerError
+from ..asyncwrappers import AsyncShellWrapper
+
+from .test_caller import App1Wrapper
+
+from nose.tools import assert_raises, assert_equal
+
+
+class AsyncApp1Wrapper(App1Wrapper, AsyncShellWrapper):
+    pass
+
+
+def test_arun():
+    app1_wrapped = AsyncApp1Wrapper()
+    assert_raises(CallerError, asyncio.run, app1_wrapped.arun())
+    app1_wrapped.set_parameters(('arg1', 'arg2'), {'option1': 'opt1'})
+    res = asyncio.run(app1_wrapped.arun())
+    assert_equal(res.result_code, 0)
+    assert_equal(res.stdout.getvalue(), b'arg1 arg2 opt1\n')
+
+
+def test_arun_concurrent():
+    wrappers = [AsyncApp1Wrapper(('arg%d' % i, 'arg2')) for i in range(8)]
+
+    async def run_all():
+        return await asyncio.gather(*[w.arun() for w in wrappers])
+
+    results = asyncio.run(run_all())
+    for i, res in enumerate(results):
+        assert_equal(res.stdout.getvalue(), ('arg%d arg2 None\n' % i).encode())
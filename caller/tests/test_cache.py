@@ -0,0 +1,126 @@
+''' Tests for result caching '''
+
+import os
+import sys
+import shutil
+import tempfile
+from os.path import join as pjoin
+
+from ..parameters import Positional
+from ..defines import ParameterDefinitions
+from ..wrappers import ShellWrapper
+from ..cache import ResultCache, file_signature
+
+from nose.tools import assert_equal, assert_true, assert_false
+
+
+class CatWrapper(ShellWrapper):
+    # Print contents of input file, count calls to ``_execute``
+    cmd = (sys.executable, '-c',
+           'import sys; sys.stdout.write(open(sys.argv[1]).read())')
+    parameter_definitions = ParameterDefinitions(
+        (Positional('infile', param_types=('input', 'file')),))
+    n_executed = 0
+
+    def _execute(self, cmd, **kwargs):
+        CatWrapper.n_executed += 1
+        return super(CatWrapper, self)._execute(cmd, **kwargs)
+
+
+def test_result_cache():
+    cache = ResultCache(maxsize=2)
+    keys = [cache.key(('cmd', str(i))) for i in range(3)]
+    assert_equal(len(set(keys)), 3)
+    for i, key in enumerate(keys):
+        assert_true(cache.set(key, [i]))
+    # Least recently used dropped
+    assert_equal(len(cache), 2)
+    assert_equal(cache.get(keys[0]), None)
+    assert_equal(cache.get(keys[2]), [2])
+    # Each get returns a copy
+    res = cache.get(keys[1])
+    res.append(99)
+    assert_equal(cache.get(keys[1]), [1])
+    # Unpicklable results are not stored
+    assert_false(cache.set(keys[0], lambda x: x))
+    cache.clear()
+    assert_equal(len(cache), 0)
+
+
+def test_disk_cache():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        cache = ResultCache(directory=pjoin(tmpdir, 'cache'))
+        key = cache.key(('cmd',))
+        cache.set(key, 'result')
+        cache.clear()
+        assert_equal(cache.get(key), 'result')
+        # A new cache finds the disk results
+        assert_equal(ResultCache(directory=cache.directory).get(key),
+                     'result')
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+def test_wrapper_cache():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        infile = pjoin(tmpdir, 'input.txt')
+        with open(infile, 'wt') as fobj:
+            fobj.write('first')
+        for hash_contents in (False, True):
+            cat = CatWrapper((infile,))
+            cat.result_cache = ResultCache(hash_contents=hash_contents)
+            CatWrapper.n_executed = 0
+            assert_equal(cat.run().stdout.getvalue(), b'first')
+            res = cat.run()
+            assert_equal(res.stdout.getvalue(), b'first')
+            assert_equal(CatWrapper.n_executed, 1)
+            # Run options bypass the cache
+            cat.run(capture='spill')
+            assert_equal(CatWrapper.n_executed, 2)
+            # Changing input file invalidates cache
+            with open(infile, 'wt') as fobj:
+                fobj.write('second file')
+            assert_equal(cat.run().stdout.getvalue(), b'second file')
+            assert_equal(CatWrapper.n_executed, 3)
+            with open(infile, 'wt') as fobj:
+                fobj.write('first')
+        # Missing files and failed runs are not cached
+        cat.set_parameters((pjoin(tmpdir, 'missing.txt'),))
+        assert_true(cat.run().result_code != 0)
+        assert_true(cat.run().result_code != 0)
+        assert_equal(CatWrapper.n_executed, 5)
+        assert_equal(file_signature(infile, True)[0], infile)
+    finally:
+        shutil.rmtree(tmpdir)
+
+
+class CopyWrapper(CatWrapper):
+    # Copy input file to output file, count calls to ``_execute``
+    cmd = (sys.executable, '-c',
+           'import sys, shutil; shutil.copy(*sys.argv[1:])')
+    parameter_definitions = ParameterDefinitions(
+        (Positional('infile', param_types=('input', 'file')),
+         Positional('outfile', param_types=('output', 'file'))))
+
+
+def test_cache_output_files():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        infile, outfile = pjoin(tmpdir, 'a.txt'), pjoin(tmpdir, 'b.txt')
+        with open(infile, 'wt') as fobj:
+            fobj.write('contents')
+        copy = CopyWrapper((infile, outfile))
+        copy.result_cache = ResultCache()
+        CatWrapper.n_executed = 0
+        assert_equal(copy.run().result_code, 0)
+        assert_equal(copy.run().result_code, 0)
+        assert_equal(CatWrapper.n_executed, 1)
+        # Missing output file; run again to make it
+        os.unlink(outfile)
+        assert_equal(copy.run().result_code, 0)
+        assert_equal(CatWrapper.n_executed, 2)
+        assert_true(os.path.exists(outfile))
+    finally:
+        shutil.rmtree(tmpdir)
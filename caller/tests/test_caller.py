@@ -1,13 +1,25 @@
 ''' Tests for high level interface for caller '''
 
+import os
+import gc
 import sys
+import shutil
+import tempfile
+import time
+import warnings
+import signal
+import subprocess
 from os.path import join as pjoin, dirname
+from io import BytesIO
+from unittest import SkipTest
 
 from ..parameters import Positional, Option
 from ..defines import ParameterDefinitions, CallerError
-from ..wrappers import ShellWrapper
+from ..wrappers import (ShellWrapper, MappedOutput, add_metrics_hook,
+                        remove_metrics_hook, CallerTimeout, CallerCancelled,
+                        _Popen, _SpawnedProcess, _Watchdog)
 
-from nose.tools import assert_raises, assert_equal, assert_true
+from nose.tools import assert_raises, assert_equal, assert_true, assert_false
 
 
 class App1Wrapper(ShellWrapper):
@@ -48,3 +60,396 @@ def test_app1():
                   app1_wrapped.set_parameters,
                   ('arg1', 'arg2'),
                   {'-2': 'opt1'})
+
+
+def test_run_many():
+    app1_wrapped = App1Wrapper()
+    param_sets = [(('arg%d' % i, 'arg2'), {'-1': 'opt%d' % i})
+                  for i in range(10)]
+    expected = [('arg%d arg2 opt%d\n' % (i, i)).encode() for i in range(10)]
+    results = list(app1_wrapped.run_many(param_sets, max_workers=3))
+    assert_equal(sorted(res.stdout.getvalue() for res in results), expected)
+    results = list(app1_wrapped.run_many(param_sets,
+                                         max_workers=4,
+                                         ordered=True))
+    assert_equal([res.stdout.getvalue() for res in results], expected)
+    # instance parameters are not changed
+    assert_equal(app1_wrapped.positionals, ())
+    # parameters are checked
+    assert_raises(CallerError, list,
+                  app1_wrapped.run_many([(('arg1',), {})]))
+    assert_raises(ValueError, list,
+                  app1_wrapped.run_many(param_sets, max_workers=0))
+
+
+class NoisyWrapper(ShellWrapper):
+    # Writes lines to stdout and as much again to stderr
+    cmd = (sys.executable, '-c',
+           'import sys\n'
+           'for i in range(int(sys.argv[1])):\n'
+           '    sys.stdout.write("line %d\\n" % i)\n'
+           '    sys.stderr.write("err %d\\n" % i)\n')
+    parameter_definitions = ParameterDefinitions(
+        (Positional('n_lines', checker=int),))
+
+
+def test_stream_capture():
+    app1_wrapped = App1Wrapper(('arg1', 'arg2'))
+    res = app1_wrapped.run(capture='stream')
+    assert_equal(res.result_code, None)
+    assert_equal(list(res.stdout), [b'arg1 arg2 None\n'])
+    assert_equal(res.wait(), 0)
+    assert_equal(res.result_code, 0)
+    assert_equal(res.stderr.read(), b'')
+    # Much more output than fits in a pipe buffer, on both pipes
+    noisy = NoisyWrapper((100000,))
+    noisy.capture = 'stream'
+    noisy.spool_size = 1024
+    res = noisy.run()
+    for i, line in enumerate(res.stdout):
+        if i == 10:
+            break
+    assert_equal(line, b'line 10\n')
+    # The rest of stdout is discarded
+    assert_equal(res.wait(), 0)
+    err_lines = res.stderr.readlines()
+    assert_equal(len(err_lines), 100000)
+    assert_equal(err_lines[-1], b'err 99999\n')
+    # Old name for stderr
+    assert_true(res.stdin is res.stderr)
+    assert_raises(ValueError, noisy.run, capture='implausible')
+
+
+def test_spill_capture():
+    noisy = NoisyWrapper((10,))
+    res = noisy.run(capture='spill')
+    assert_equal(res.result_code, 0)
+    # Small output stays in memory
+    assert_equal(res.stdout.getvalue(),
+                 b''.join(b'line %d\n' % i for i in range(10)))
+    assert_false(isinstance(res.stdout, MappedOutput))
+    # Large output spills to disk, read back through memory map
+    noisy = NoisyWrapper((100000,))
+    noisy.spool_size = 1024
+    res = noisy.run(capture='spill')
+    assert_equal(res.result_code, 0)
+    for stream, prefix in ((res.stdout, b'line'), (res.stderr, b'err')):
+        assert_true(isinstance(stream, MappedOutput))
+        lines = list(stream)
+        assert_equal(len(lines), 100000)
+        assert_equal(lines[-1], prefix + b' 99999\n')
+        buf = stream.getbuffer()
+        assert_equal(buf.readonly, True)
+        assert_equal(bytes(buf[:len(prefix)]), prefix)
+        buf.release()
+        stream.close()
+
+
+def test_metrics():
+    app1_wrapped = App1Wrapper(('arg1', 'arg2'))
+    res = app1_wrapped.run()
+    assert_equal(sorted(res.timings), ['check', 'render', 'spawn', 'wait'])
+    assert_true(all(t >= 0 for t in res.timings.values()))
+    if hasattr(os, 'wait4'):
+        assert_true(res.rusage.ru_maxrss > 0)
+    # Hooks get metrics for each run
+    reports = []
+    def hook(wrapper, cmdline, metrics):
+        reports.append((wrapper, cmdline, metrics))
+    add_metrics_hook(hook)
+    try:
+        res = app1_wrapped.run()
+        assert_equal(len(reports), 1)
+        wrapper, cmdline, metrics = reports[0]
+        assert_true(wrapper is app1_wrapped)
+        assert_equal(cmdline, app1_wrapped.cmdline())
+        assert_equal(metrics['result_code'], 0)
+        assert_true(metrics['timings'] is res.timings)
+        assert_true(metrics['rusage'] is res.rusage)
+        list(app1_wrapped.run_many([(('a', 'b'), {})] * 2))
+        assert_equal(len(reports), 3)
+        assert_true('render' in reports[-1][2]['timings'])
+        # Streamed runs get wait time and resource usage on wait
+        res = app1_wrapped.run(capture='stream')
+        assert_false('wait' in res.timings)
+        res.wait()
+        assert_true('wait' in res.timings)
+        if hasattr(os, 'wait4'):
+            assert_true(res.rusage is not None)
+    finally:
+        remove_metrics_hook(hook)
+    app1_wrapped.run()
+    assert_equal(len(reports), 4)
+
+
+def test_popen_rusage():
+    if not hasattr(os, 'wait4'):
+        raise SkipTest('Needs os.wait4')
+    # Resource usage however child is reaped
+    for reap in ('wait', 'poll', 'timeout', 'kill'):
+        child = _Popen([sys.executable, '-c', 'import time; time.sleep(0.1)'])
+        if reap == 'wait':
+            assert_equal(child.wait(), 0)
+        elif reap == 'poll':
+            while child.poll() is None:
+                time.sleep(0.01)
+        elif reap == 'timeout':
+            assert_raises(subprocess.TimeoutExpired, child.wait, 0.01)
+            assert_equal(child.wait(10), 0)
+        else:
+            child.kill()
+            assert_equal(child.wait(), -signal.SIGKILL)
+            # Signal after reaping does nothing
+            child.send_signal(signal.SIGKILL)
+        assert_true(child.rusage is not None)
+
+
+def test_posix_spawn():
+    app1_wrapped = App1Wrapper(('arg1', 'arg2'), {'option1': 'opt1'})
+    app1_wrapped.spawn = 'posix_spawn'
+    for capture in ('memory', 'spill', 'stream'):
+        res = app1_wrapped.run(capture=capture)
+        assert_equal(res.stdout.read(), b'arg1 arg2 opt1\n')
+        assert_equal(res.wait(), 0)
+        assert_equal(res.stderr.read(), b'')
+        assert_true(res.timings['spawn'] >= 0)
+        if hasattr(os, 'wait4'):
+            assert_true(res.rusage is not None)
+    res = NoisyWrapper((100000,)).run(spawn='posix_spawn')
+    assert_equal(len(res.stderr.getvalue().splitlines()), 100000)
+    # Failing commands, as for Popen
+    outputs = app1_wrapped._execute(
+        (sys.executable, '-c', 'import sys; sys.exit(3)'), spawn='posix_spawn')
+    assert_equal(outputs[0], 3)
+    for spawn in ('popen', 'posix_spawn'):
+        assert_raises(OSError,
+                      NoisyWrapper((1,))._execute,
+                      ('/implausible/command',), spawn=spawn)
+    assert_raises(ValueError, app1_wrapped.run, spawn='implausible')
+
+
+def test_spawn_signals():
+    # Signals Python ignores are not ignored in child, for either spawn
+    # method
+    if not os.path.exists('/proc/self/status'):
+        raise SkipTest('Needs /proc/self/status')
+    python_signals = (1 << signal.SIGPIPE - 1) | (1 << signal.SIGXFSZ - 1)
+    wrapped = ShellWrapper.__new__(ShellWrapper)
+    for spawn in ('popen', 'posix_spawn'):
+        outputs = wrapped._execute(('grep', 'SigIgn', '/proc/self/status'),
+                                   spawn=spawn)
+        ignored = int(outputs[1].getvalue().split()[1], 16)
+        assert_equal(ignored & python_signals, 0)
+
+
+class FilterWrapper(ShellWrapper):
+    # Keep lines from stdin containing `word`; exit with code `code`
+    cmd = (sys.executable, '-c',
+           'import sys\n'
+           'n = 0\n'
+           'for line in sys.stdin:\n'
+           '    if sys.argv[1] in line:\n'
+           '        sys.stdout.write(line)\n'
+           '        n += 1\n'
+           'sys.stderr.write("%d %s\\n" % (n, sys.argv[1]))\n'
+           'sys.exit(int(sys.argv[2]))\n')
+    parameter_definitions = ParameterDefinitions(
+        (Positional('word'), Positional('code', checker=int)))
+
+
+def test_pipes():
+    pipe = NoisyWrapper((100000,)) | FilterWrapper(('99', 0))
+    assert_equal(len(pipe.wrappers), 2)
+    pipe = pipe | (FilterWrapper(('999', 3)) | FilterWrapper(('1', 0)))
+    assert_equal(len(pipe.wrappers), 4)
+    res = pipe.run()
+    assert_equal(res.result_codes, [0, 0, 3, 0])
+    assert_equal(res.result_code, 0)
+    assert_equal(res.stdout.getvalue().splitlines(),
+                 [b'line %d' % i for i in range(100000)
+                  if b'999' in b'%d' % i and b'1' in b'%d' % i])
+    assert_equal(len(res.stderrs), 4)
+    assert_equal(len(res.stderrs[0].getvalue().splitlines()), 100000)
+    n_999 = len([i for i in range(100000) if '999' in 'line %d' % i])
+    assert_equal(res.stderrs[2].getvalue(), b'%d 999\n' % n_999)
+    assert_true(res.stderr is res.stderrs[-1])
+    assert_equal(sorted(res.timings), ['spawn', 'wait'])
+    assert_equal(len(res.rusages), 4)
+    # Errors starting commands
+    bad = ShellWrapper.__new__(ShellWrapper)
+    bad.cmdline = lambda: ('/implausible/command',)
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', ResourceWarning)
+        assert_raises(OSError, (NoisyWrapper((10,)) | bad).run)
+        gc.collect()
+    # Pipes to commands already started were closed, not left to the garbage
+    # collector
+    assert_equal([w for w in caught
+                  if issubclass(w.category, ResourceWarning)], [])
+
+
+def test_stdin():
+    lines = b''.join(b'line %d\n' % i for i in range(100000))
+    expected = [b'line %d' % i for i in range(100000) if b'99' in b'%d' % i]
+    wrapped = FilterWrapper(('99', 0))
+    tmpdir = tempfile.mkdtemp()
+    tmp_fname = pjoin(tmpdir, 'stdin_test.txt')
+    with open(tmp_fname, 'wb') as fobj:
+        fobj.write(lines)
+    try:
+        with open(tmp_fname, 'rb') as fobj:
+            # Callables returning new stdin source for each run
+            sources = [lambda: tmp_fname,
+                       lambda: lines,
+                       lambda: bytearray(lines),
+                       lambda: memoryview(lines),
+                       lambda: BytesIO(lines),
+                       lambda: iter(lines.splitlines(True)),
+                       lambda: fobj,
+                       lambda: fobj.fileno()]
+            for source in sources:
+                for spawn in ('popen', 'posix_spawn'):
+                    for capture in ('memory', 'spill', 'stream'):
+                        fobj.seek(0)
+                        res = wrapped.run(stdin=source(), spawn=spawn,
+                                          capture=capture)
+                        assert_equal(res.stdout.read().splitlines(),
+                                     expected)
+                        assert_equal(res.wait(), 0)
+    finally:
+        shutil.rmtree(tmpdir)
+    # Command need not read all input
+    res = wrapped._execute((sys.executable, '-c', 'pass'), stdin=lines * 10)
+    assert_equal(res[0], 0)
+
+    # Errors getting input propagate after command finishes
+    def bad_chunks():
+        yield b'line 99\n'
+        raise RuntimeError('No more')
+
+    assert_raises(RuntimeError, wrapped.run, stdin=bad_chunks())
+    # Bools are not file descriptors
+    assert_raises(TypeError, wrapped.run, stdin=False)
+    assert_raises(TypeError, wrapped.run, stdin=True)
+
+
+class SleepWrapper(ShellWrapper):
+    # Sleep in command, and in a process started by the command
+    cmd = (sys.executable, '-c',
+           'import sys, time, subprocess\n'
+           'subprocess.Popen([sys.executable, "-c", '
+           '"import time; time.sleep(%s)" % sys.argv[1]])\n'
+           'time.sleep(float(sys.argv[1]))\n')
+    parameter_definitions = ParameterDefinitions((Positional('seconds'),))
+
+
+def test_timeout_cancel():
+    from threading import Event, Timer
+    from time import perf_counter
+    wrapped = SleepWrapper((0,))
+    assert_equal(wrapped.run(timeout=10).result_code, 0)
+    # Commands run with a timeout start in a new session without
+    # new_session, so the watchdog can kill the grandchild holding the pipes
+    wrapped = SleepWrapper((30,))
+    for spawn in ('popen', 'posix_spawn'):
+        for capture in ('memory', 'spill', 'stream'):
+            start = perf_counter()
+            assert_raises(CallerTimeout,
+                          lambda: wrapped.run(timeout=0.2,
+                                              spawn=spawn,
+                                              capture=capture).wait())
+            # The grandchild sleep is killed too, so pipes close
+            assert_true(perf_counter() - start < 10)
+    cancel = Event()
+    Timer(0.2, cancel.set).start()
+    start = perf_counter()
+    assert_raises(CallerCancelled, wrapped.run, cancel=cancel)
+    assert_true(perf_counter() - start < 10)
+    # Already cancelled
+    assert_raises(CallerCancelled, SleepWrapper((0,)).run, cancel=cancel)
+    # Default timeout from class; errors are CallerErrors
+    wrapped.timeout = 0.2
+    assert_raises(CallerError, wrapped.run)
+    # Watchdog firing after the child was reaped does not kill, or raise
+    children = [_Popen(['true'])]
+    if hasattr(os, 'posix_spawnp'):
+        children.append(_SpawnedProcess(['true']))
+    for child in children:
+        child.communicate()
+        watchdog = _Watchdog(child, timeout=0)
+        watchdog._thread.join()
+        watchdog.finish()
+        assert_equal(watchdog.reason, None)
+
+
+class LimitsWrapper(ShellWrapper):
+    # Print open file limit, niceness and CPU affinity of command
+    cmd = (sys.executable, '-c',
+           'import os, resource\n'
+           'print(resource.getrlimit(resource.RLIMIT_NOFILE)[0])\n'
+           'print(os.nice(0))\n'
+           'print(sorted(os.sched_getaffinity(0)))\n')
+    parameter_definitions = ParameterDefinitions(())
+
+
+class NativeLimitsWrapper(ShellWrapper):
+    # Print open file limit, niceness, ignored signals and CPU affinity,
+    # from commands that start in much less time than Python
+    cmd = ('sh', '-c',
+           'ulimit -n; nice; '
+           'sed -n "s/^\\(SigIgn\\|Cpus_allowed_list\\):\\s*//p" '
+           '/proc/self/status')
+    parameter_definitions = ParameterDefinitions(())
+
+
+def _limits(res):
+    nofile, nice, cpus = res.stdout.read().decode('ascii').splitlines()
+    return int(nofile), int(nice), eval(cpus)
+
+
+def test_limits():
+    if not hasattr(os, 'sched_getaffinity'):
+        raise SkipTest('Needs resource limits and CPU affinity')
+    our_nice = os.nice(0)
+    our_cpus = sorted(os.sched_getaffinity(0))
+    wrapped = LimitsWrapper()
+    nofile, nice, cpus = _limits(wrapped.run())
+    assert_equal((nice, cpus), (our_nice, our_cpus))
+    for spawn in ('popen', 'posix_spawn'):
+        res = wrapped.run(spawn=spawn, rlimits={'nofile': 64}, nice=2,
+                          cpu_affinity=our_cpus[:1])
+        assert_equal(_limits(res), (64, our_nice + 2, our_cpus[:1]))
+    wrapped.rlimits = {'RLIMIT_NOFILE': (32, nofile)}
+    assert_equal(_limits(wrapped.run())[0], 32)
+    assert_raises(ValueError, wrapped.run, rlimits={'implausible': 1})
+    # Soft limit above hard limit
+    assert_raises(ValueError, wrapped.run, rlimits={'nofile': (64, 32)})
+    # Missing commands raise, as without limits
+    bad = NativeLimitsWrapper()
+    bad.cmd = '/implausible/command'
+    assert_raises(OSError, bad.run, nice=1)
+    # Limits are in place before fast native commands start
+    python_signals = (1 << signal.SIGPIPE - 1) | (1 << signal.SIGXFSZ - 1)
+    native = NativeLimitsWrapper()
+    for spawn in ('popen', 'posix_spawn'):
+        for i in range(50):
+            res = native.run(spawn=spawn, rlimits={'nofile': 64}, nice=2,
+                             cpu_affinity=our_cpus[:1])
+            nofile, nice, sigign, cpus = res.stdout.read().split()
+            assert_equal((int(nofile), int(nice), cpus),
+                         (64, our_nice + 2, b'%d' % our_cpus[0]))
+            assert_equal(int(sigign, 16) & python_signals, 0)
+    # Through the shell
+    native.shell = True
+    native.cmd = 'ulimit -n'
+    assert_equal(native.run(rlimits={'nofile': 64}).stdout.read(), b'64\n')
+    # Pinning slices of CPUs in run_many
+    results = list(wrapped.run_many([((), {})] * 4, max_workers=2,
+                                    pin_cpus=True))
+    assert_equal(len(results), 4)
+    for res in results:
+        cpus = _limits(res)[2]
+        assert_true(len(cpus) >= 1)
+        assert_true(set(cpus) <= set(our_cpus))
+        if len(our_cpus) >= 2:
+            assert_true(len(cpus) <= len(our_cpus) // 2 + 1)
@@ -1,5 +1,7 @@
 ''' Test for wrapping interface '''
 
+from unittest import SkipTest
+
 from caller import Positional, Option, Flag, CallerError
 from caller.defines import PositionalContainer, ParameterDefinitions
 
@@ -38,6 +40,10 @@ def test_pos_container():
     assert_equal(pc.index('param2'), 1)
     assert_equal(pc.index('p2'), 1)
     assert_raises(ValueError, pc.index, 'implausible')
+    # index lookups come from precomputed mapping
+    assert_equal(pc.key_indices,
+                 {'param1': 0, 'p1': 0, 'prm1': 0,
+                  'param2': 1, 'p2': 1, 'prm2': 1})
 
 
 def test_param_defs_init():
@@ -122,3 +128,74 @@ def test_param_defs_cmdline():
     assert_equal(
         pd.make_cmdline(('cmd',), ('arg1',), {'o3': True}),
         ('cmd', '--option3', 'arg1'))
+
+
+def test_param_defs_compile():
+    pd = ParameterDefinitions((p1, p2), (o1, o2, f1))
+    template = pd.compile(('cmd',))
+    # templates are cached by command
+    assert_true(pd.compile(['cmd']) is template)
+    assert_true(pd.compile('cmd') is template)
+    assert_equal(template.cmd, ('cmd',))
+    assert_raises(CallerError, template.render)
+    assert_equal(template.render(('a1', 'a2')), ('cmd', 'a1', 'a2'))
+    assert_equal(template.render(('arg1',), {'o1': '3', 'o3': True}),
+                 ('cmd', '--option1=3', '--option3', 'arg1'))
+    # named positionals
+    assert_equal(template.render((), {'prm1': 'arg1'}), ('cmd', 'arg1'))
+    # checked values must use canonical names
+    assert_equal(template.render(('arg1',), {'option2': 4}, checked=True),
+                 ('cmd', '--option2=4', 'arg1'))
+    assert_raises(CallerError, template.render, ('1', '2', '3'),
+                  checked=True)
+    # required options
+    pd = ParameterDefinitions((p1,), (Option('req', is_required=True),))
+    assert_raises(CallerError, pd.compile('cmd').render, ('a1',))
+    assert_equal(pd.compile('cmd').render(('a1',), {'req': 1}),
+                 ('cmd', '--req=1', 'a1'))
+    # repeating last positional
+    pd = ParameterDefinitions((p1, p2), pos_last_repeat=True)
+    assert_equal(pd.compile('cmd').render(('1', '2', '3'), checked=True),
+                 ('cmd', '1', '2', '3'))
+
+
+def test_param_defs_cmdlines():
+    pd = ParameterDefinitions((p1, p2), (o1, o2, f1))
+    rows = {'p1': ['a', 'b', 'c'],
+            'o1': [1, 2, 3],
+            'param2': ['x', 'y', 'z'],
+            'option3': [True, False, True]}
+    cmdlines = pd.make_cmdlines('cmd', rows)
+    # Same as rendering each row in turn
+    for i, cmdline in enumerate(cmdlines):
+        row = dict((key, values[i]) for key, values in rows.items())
+        assert_equal(cmdline, pd.make_cmdline('cmd', (), row))
+    assert_equal(cmdlines[1], ('cmd', '--option1=2', '', 'b', 'y'))
+    # Positionals only
+    assert_equal(pd.make_cmdlines('cmd', {'param1': ['a', 'b']}),
+                 [('cmd', 'a'), ('cmd', 'b')])
+    # Missing required positional
+    assert_raises(CallerError, pd.make_cmdlines, 'cmd', {'o1': [1]})
+    # Gap in positionals
+    assert_raises(CallerError, pd.make_cmdlines, 'cmd',
+                  {'param1': [1], 'param3': [1]})
+    assert_raises(CallerError, pd.make_cmdlines, 'cmd', {'param2': [1]})
+    # Unequal lengths
+    assert_raises(CallerError, pd.make_cmdlines, 'cmd',
+                  {'param1': [1], 'o1': [1, 2]})
+    # Empty batch
+    assert_equal(ParameterDefinitions((p2,)).make_cmdlines('cmd', {}), [])
+
+
+def test_param_defs_cmdlines_structured():
+    try:
+        import numpy as np
+    except ImportError:
+        raise SkipTest('Need numpy for structured arrays')
+    pd = ParameterDefinitions((p1, p2), (Option('option1', checker=float),))
+    rows = np.zeros(2, dtype=[('param1', 'U4'), ('option1', 'f8')])
+    rows['param1'] = ['a', 'b']
+    rows['option1'] = [1, 2]
+    assert_equal(pd.make_cmdlines('cmd', rows),
+                 [('cmd', '--option1=1.0', 'a'),
+                  ('cmd', '--option1=2.0', 'b')])
@@ -0,0 +1,173 @@
+''' Tests for launcher server '''
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+from os.path import join as pjoin
+
+from ..defines import CallerError
+from ..launcher import Launcher, ScriptWorker
+
+from .test_caller import App1Wrapper
+
+from nose.tools import assert_raises, assert_equal, assert_true
+
+
+class BadReplyLauncher(Launcher):
+    # Server replying to the first request with a message that does not
+    # unpickle, if `python_code` is not None
+    python_code = ('import sys\n'
+                   'sys.stdin.buffer.read(4)\n'
+                   'sys.stdout.buffer.write(b"\\x00\\x00\\x00\\x02xx")\n'
+                   'sys.stdout.flush()\n'
+                   'sys.stdin.buffer.read()\n')
+
+    def _server_cmd(self):
+        if self.python_code is None:
+            return super(BadReplyLauncher, self)._server_cmd()
+        return [self.python, '-c', self.python_code]
+
+
+def test_launcher():
+    with Launcher() as launcher:
+        code, out, err = launcher.execute(
+            [sys.executable, '-c',
+             'import sys; print("out"); sys.stderr.write("err"); sys.exit(2)'])
+        assert_equal((code, out.strip(), err), (2, b'out', b'err'))
+        assert_equal(launcher.execute(['echo $0'], shell=True)[1].strip(),
+                     b'/bin/sh')
+        # Errors starting commands raise in parent
+        assert_raises(OSError, launcher.execute, ['/implausible/command'])
+        # Concurrent commands
+        results = {}
+        def run(i):
+            results[i] = launcher.execute(
+                [sys.executable, '-c', 'print(%d)' % i])[1]
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert_equal(results, dict((i, b'%d\n' % i) for i in range(8)))
+        # Restarts after server exits
+        launcher.close()
+        assert_equal(launcher.execute(['echo', 'again'])[1], b'again\n')
+    # Commands reading stdin get empty input, not the request pipe
+    with Launcher() as launcher:
+        assert_equal(launcher.execute(['cat']), (0, b'', b''))
+        assert_equal(launcher.execute(['head', '-c', '4'])[1], b'')
+        assert_equal(launcher.execute(['echo', 'after'])[1], b'after\n')
+    # Bad replies fail waiting commands, and restart the server
+    launcher = BadReplyLauncher()
+    assert_raises(CallerError, launcher.execute, ['echo', 'bad'])
+    launcher.python_code = None
+    assert_equal(launcher.execute(['echo', 'good'])[1], b'good\n')
+    launcher.close()
+    # Server failure fails waiting commands
+    launcher = Launcher()
+    launcher.start()
+    timer = threading.Timer(0.2, launcher._server.kill)
+    timer.start()
+    assert_raises(CallerError, launcher.execute, ['sleep', '5'])
+    timer.join()
+    launcher.close()
+
+
+def test_wrapper_launcher():
+    app1_wrapped = App1Wrapper(('arg1', 'arg2'), {'option1': 'opt1'})
+    app1_wrapped.launcher = Launcher()
+    try:
+        res = app1_wrapped.run()
+        assert_equal(res.result_code, 0)
+        assert_equal(res.stdout.getvalue(), b'arg1 arg2 opt1\n')
+        assert_true('wait' in res.timings)
+        results = list(app1_wrapped.run_many([(('a', 'b'), {})] * 4))
+        assert_equal([r.stdout.getvalue() for r in results],
+                     [b'a b None\n'] * 4)
+    finally:
+        app1_wrapped.launcher.close()
+
+
+def test_script_worker():
+    script = App1Wrapper.cmd[-1]
+    worker = ScriptWorker(script)
+    try:
+        code, out, err = worker.execute(App1Wrapper.cmd + ('a1', 'a2'))
+        assert_equal((code, out, err), (0, b'a1 a2 None\n', b''))
+        # Argument errors from argparse exit with code 2
+        code, out, err = worker.execute(App1Wrapper.cmd + ('a1',))
+        assert_equal(code, 2)
+        assert_true(b'too few arguments' in err)
+        # The worker stays up for more commands
+        code, out, err = worker.execute(
+            App1Wrapper.cmd + ('-1', 'o', 'a', 'b'))
+        assert_equal(out, b'a b o\n')
+        # Commands for other scripts are errors
+        assert_raises(ValueError, worker.execute, (sys.executable, 'other.py'))
+        # Use as launcher for wrapper
+        app1_wrapped = App1Wrapper(('arg1', 'arg2'), {'option1': 'opt1'})
+        app1_wrapped.launcher = worker
+        res = app1_wrapped.run()
+        assert_equal(res.stdout.getvalue(), b'arg1 arg2 opt1\n')
+        results = list(app1_wrapped.run_many([(('a', 'b'), {})] * 3))
+        assert_equal([r.stdout.getvalue() for r in results],
+                     [b'a b None\n'] * 3)
+    finally:
+        worker.close()
+
+
+def test_script_worker_fds():
+    # Output to file descriptors, and reading stdin, do not reach the
+    # protocol pipes
+    tmpdir = tempfile.mkdtemp()
+    script = pjoin(tmpdir, 'spawner.py')
+    with open(script, 'wt') as fobj:
+        fobj.write('import os, sys, subprocess\n'
+                   'os.system("echo system")\n'
+                   'subprocess.call(["echo", "subprocess"])\n'
+                   'os.write(1, b"fd 1\\n")\n'
+                   'print(sys.stdin.read() + sys.argv[1])\n')
+    worker = ScriptWorker(script)
+    try:
+        for arg in ('first', 'second'):
+            assert_equal(worker.execute((sys.executable, script, arg)),
+                         (0, arg.encode() + b'\n', b''))
+    finally:
+        worker.close()
+        shutil.rmtree(tmpdir)
+
+
+def test_launcher_cwd_env():
+    # Commands run in current directory and environment of caller
+    tmpdir = os.path.realpath(tempfile.mkdtemp())
+    cwd = os.getcwd()
+    script = os.path.realpath(App1Wrapper.cmd[-1])
+    shutil.copy(script, tmpdir)
+    show = (sys.executable, '-c',
+            'import os; print(os.getcwd(), os.environ.get("CALLER_TEST"))')
+    launcher = Launcher()
+    worker = ScriptWorker(script)
+    try:
+        launcher.start()
+        worker.start()
+        os.chdir(tmpdir)
+        os.environ['CALLER_TEST'] = 'value'
+        out = launcher.execute(show)[1]
+        assert_equal(out.decode(), '%s value\n' % tmpdir)
+        # Relative script in commands is relative to current directory
+        assert_raises(ValueError, worker.execute,
+                      (sys.executable, 'app1.py', 'a', 'b'))
+        os.chdir(os.path.dirname(script))
+        out = worker.execute((sys.executable, 'app1.py', 'a', 'b'))[1]
+        assert_equal(out, b'a b None\n')
+        del os.environ['CALLER_TEST']
+        out = launcher.execute(show)[1]
+        assert_equal(out.decode(), '%s None\n' % os.path.dirname(script))
+    finally:
+        os.environ.pop('CALLER_TEST', None)
+        os.chdir(cwd)
+        launcher.close()
+        worker.close()
+        shutil.rmtree(tmpdir)
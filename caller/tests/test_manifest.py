@@ -0,0 +1,78 @@
+''' Tests for manifests of successful runs '''
+
+import os
+import shutil
+import tempfile
+from os.path import join as pjoin
+
+from ..manifest import Manifest
+from ..pipeline import Pipeline
+
+from .test_pipeline import ConcatWrapper
+
+from nose.tools import assert_equal, assert_true, assert_false
+
+
+def test_manifest():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        def path(name):
+            return pjoin(tmpdir, name)
+        def write(name, contents):
+            with open(path(name), 'wt') as fobj:
+                fobj.write(contents)
+        write('x', 'x')
+        manifest_fname = path('manifest.json')
+        with Manifest(manifest_fname) as manifest:
+            concat = ConcatWrapper((path('a'), path('x')))
+            concat.manifest = manifest
+            res = concat.run()
+            assert_equal(res.result_code, 0)
+            assert_false(res.up_to_date)
+            assert_equal(len(manifest), 1)
+            # Second run skipped
+            res = concat.run()
+            assert_equal(res.result_code, 0)
+            assert_true(res.up_to_date)
+            # Unless we pass run options
+            assert_false(concat.run(capture='spill').up_to_date)
+            # Changed command line runs again
+            concat.set_parameters((path('a'), path('x')), {'delay': 0})
+            assert_false(concat.run().up_to_date)
+            assert_true(concat.run().up_to_date)
+            # Changed input file
+            write('x', 'xx')
+            assert_false(concat.run().up_to_date)
+            assert_true(concat.run().up_to_date)
+            # Changed or missing output file
+            write('a', 'changed')
+            assert_false(concat.run().up_to_date)
+            os.unlink(path('a'))
+            assert_false(concat.run().up_to_date)
+            # Input newer than output, as for make
+            assert_true(manifest.is_current(
+                concat.cmdline(), [path('x')], [path('a')]))
+            stat = os.stat(path('x'))
+            os.utime(path('a'), ns=(stat.st_atime_ns,
+                                    stat.st_mtime_ns - 10 ** 9))
+            manifest.record(concat.cmdline(), [path('x')], [path('a')])
+            assert_false(concat.run().up_to_date)
+            # Jobs without outputs are never up to date
+            assert_false(manifest.is_current(('cmd',), [path('x')], []))
+        # Manifest saved on exit from context manager
+        manifest = Manifest(manifest_fname)
+        assert_equal(len(manifest), 1)
+        concat.manifest = manifest
+        assert_true(concat.run().up_to_date)
+        # Pipelines skip up to date jobs
+        pipeline = Pipeline()
+        pipeline.add(concat, 'a')
+        second = ConcatWrapper((path('b'), path('a')))
+        second.manifest = manifest
+        pipeline.add(second, 'b')
+        results = pipeline.run()
+        assert_true(results['a'].up_to_date)
+        assert_false(results['b'].up_to_date)
+        assert_true(pipeline.run()['b'].up_to_date)
+    finally:
+        shutil.rmtree(tmpdir)
@@ -0,0 +1,106 @@
+''' Tests for pipelines of wrapped commands '''
+
+import sys
+import shutil
+import tempfile
+from os.path import join as pjoin, exists
+
+from ..parameters import Positional, Option
+from ..defines import ParameterDefinitions, CallerError
+from ..wrappers import ShellWrapper
+from ..pipeline import Pipeline, PipelineError
+
+from nose.tools import assert_raises, assert_equal, assert_true
+
+
+class ConcatWrapper(ShellWrapper):
+    # Concatenate input files to output file, after `delay` seconds
+    cmd = (sys.executable, '-c',
+           'import sys, time\n'
+           'args = sys.argv[1:]\n'
+           'if args[0].startswith("--delay="):\n'
+           '    time.sleep(float(args.pop(0)[8:]))\n'
+           'out = open(args[0], "wt")\n'
+           'for fname in args[1:]:\n'
+           '    out.write(open(fname).read())\n')
+    parameter_definitions = ParameterDefinitions(
+        (Positional('outfile', param_types=('output', 'file')),
+         Positional('infiles', param_types=('input', 'file'))),
+        (Option('delay', checker=float),),
+        pos_last_repeat=True)
+
+
+def test_dependencies():
+    pipeline = Pipeline()
+    pipeline.add(ConcatWrapper(('c', 'a', 'b')), 'c')
+    pipeline.add(ConcatWrapper(('a', 'x')), 'a')
+    pipeline.add(ConcatWrapper(('b', 'x')), 'b')
+    pipeline.add(ConcatWrapper(('d',)), 'd', after=['a'])
+    assert_equal(pipeline.dependencies(),
+                 {'a': set(), 'b': set(), 'c': {'a', 'b'}, 'd': {'a'}})
+    assert_equal(pipeline.order(), ['a', 'b', 'd', 'c'])
+    assert_raises(CallerError, pipeline.add, ConcatWrapper(('e',)), 'a')
+    # Default names
+    assert_equal(pipeline.add(ConcatWrapper(('e',))), 'ConcatWrapper-4')
+    # Two jobs writing the same file
+    pipeline.add(ConcatWrapper(('a', 'y')), 'a2')
+    assert_raises(CallerError, pipeline.dependencies)
+    # Cycles
+    pipeline = Pipeline()
+    pipeline.add(ConcatWrapper(('a', 'b')), 'a')
+    pipeline.add(ConcatWrapper(('b', 'a')), 'b')
+    assert_raises(CallerError, pipeline.order)
+    # Unknown explicit dependencies
+    pipeline = Pipeline()
+    pipeline.add(ConcatWrapper(('a',)), 'a', after=['implausible'])
+    assert_raises(CallerError, pipeline.dependencies)
+
+
+def test_order_long_chain():
+    # Ordering takes time linear in jobs and dependencies; a long chain,
+    # added last job first, was very slow with a quadratic scan per job
+    n_jobs = 5000
+    pipeline = Pipeline()
+    for i in range(n_jobs - 1, -1, -1):
+        after = ['job%d' % (i - 1)] if i else []
+        pipeline.add(ConcatWrapper(('out%d' % i,)), 'job%d' % i, after)
+    assert_equal(pipeline.order(), ['job%d' % i for i in range(n_jobs)])
+
+
+def test_run():
+    tmpdir = tempfile.mkdtemp()
+    try:
+        def path(name):
+            return pjoin(tmpdir, name)
+        with open(path('x'), 'wt') as fobj:
+            fobj.write('x')
+        pipeline = Pipeline()
+        # Declared first, but depends on the others
+        pipeline.add(ConcatWrapper((path('c'), path('a'), path('b'))), 'c')
+        pipeline.add(ConcatWrapper((path('a'), path('x')), {'delay': 0.3}),
+                     'a')
+        pipeline.add(ConcatWrapper((path('b'), path('x'), path('x')),
+                                   {'delay': 0.3}),
+                     'b')
+        results = pipeline.run(max_workers=2)
+        assert_equal(list(results)[-1], 'c')
+        assert_true(all(res.result_code == 0 for res in results.values()))
+        with open(path('c'), 'rt') as fobj:
+            assert_equal(fobj.read(), 'xxx')
+        # Failed jobs stop dependent jobs
+        pipeline = Pipeline()
+        pipeline.add(ConcatWrapper((path('e'), path('missing'))), 'e')
+        pipeline.add(ConcatWrapper((path('f'), path('e'))), 'f')
+        pipeline.add(ConcatWrapper((path('g'), path('x'))), 'g')
+        try:
+            pipeline.run()
+        except PipelineError as err:
+            assert_equal(err.failed, ['e'])
+            assert_equal(err.skipped, ['f'])
+            assert_equal(sorted(err.results), ['e', 'g'])
+        else:
+            raise AssertionError('Expecting PipelineError')
+        assert_true(exists(path('g')))
+        assert_true(not exists(path('f')))
+    finally:
+        shutil.rmtree(tmpdir)
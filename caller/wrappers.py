@@ -1,5 +1,56 @@
+import os
+import sys
+import mmap
+import errno
+import shutil
+import signal
 from io import BytesIO
+from collections import deque
 import subprocess
+import tempfile
+import threading
+from concurrent import futures
+from time import perf_counter, sleep
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+from .defines import CallerError
+from . import execlimits
+
+# Size of chunks for copying to and from pipes
+_CHUNK_SIZE = 2 ** 16
+
+# Callables to receive metrics from each command run
+_metrics_hooks = []
+
+
+def add_metrics_hook(hook):
+    """ Register `hook` to receive metrics for each wrapped command run
+
+    Parameters
+    ----------
+    hook : callable
+        called as ``hook(wrapper, cmdline, metrics)`` after each command run
+        by ``AppWrapper.run`` or ``AppWrapper.run_many``, where ``metrics`` is
+        a dict with keys:
+
+        * 'result_code' : result code of command, None if still running
+        * 'timings' : dict of seconds spent in each phase of the run; for
+          ``ShellWrapper`` these are 'check' (checking parameters), 'render'
+          (making command line), 'spawn' (starting process) and 'wait'
+          (waiting for process and capturing output).  A command still
+          running has no 'wait' time.
+        * 'rusage' : resource usage of the command, as returned by
+          ``os.wait4``, or None if not available
+    """
+    _metrics_hooks.append(hook)
+
+
+def remove_metrics_hook(hook):
+    """ Remove `hook` registered with ``add_metrics_hook`` """
+    _metrics_hooks.remove(hook)
 
 
 class AppWrapper(object):
@@ -15,10 +66,23 @@ class AppWrapper(object):
       defining valid positional and named arguments
     * result_maker : callable accepting results of running command, returning
       packaged result output
+    * result_cache : None or cache object such as
+      :class:`caller.cache.ResultCache`.  If not None, ``run`` returns stored
+      results for commands that have already run with the same command line
+      and input files (parameters with ``param_types`` 'input' and 'file').
+      Only results with ``result_code`` 0 are stored.  Commands with missing
+      output files always run, to make the files.
+    * manifest : None or manifest object such as
+      :class:`caller.manifest.Manifest`.  If not None, ``run`` skips commands
+      that are up to date according to the manifest, returning a result with
+      ``up_to_date`` set to True, and records successful runs in the
+      manifest.
     """
     cmd = None
     parameter_definitions = None
     result_maker = None
+    result_cache = None
+    manifest = None
 
     def __init__(self, positionals=(), named=None):
         """ Create AppWrapper instance
@@ -32,6 +96,7 @@ class AppWrapper(object):
         """
         self._positionals = ()
         self._options = {}
+        self._check_time = 0.0
         self.set_parameters(positionals, named)
 
     @property
@@ -56,18 +121,54 @@ class AppWrapper(object):
         """
         if named is None:
             named = {}
+        start = perf_counter()
         pchecker = self.parameter_definitions
         self._positionals, named = pchecker.checked_values(
             positionals,
             named)
         self._options.update(named)
+        self._check_time = perf_counter() - start
 
-    def run(self):
+    def input_files(self):
+        """ Return filenames of input files for current parameters
+
+        Input files are values of parameters with 'input' and 'file' in their
+        ``param_types``.
+        """
+        return self.parameter_definitions.file_values(
+            self._positionals, self._options, 'input')
+
+    def output_files(self):
+        """ Return filenames of output files for current parameters
+
+        Output files are values of parameters with 'output' and 'file' in
+        their ``param_types``.
+        """
+        return self.parameter_definitions.file_values(
+            self._positionals, self._options, 'output')
+
+    def cmdline(self):
+        """ Return command line tuple for current parameters
+
+        Returns
+        -------
+        cmdline : tuple
+            command line tuple, as rendered by ``self.parameter_definitions``
+        """
+        return self.parameter_definitions.make_cmdline(
+            self.cmd,
+            self._positionals,
+            self._options,
+            checked=True)
+
+    def run(self, **kwargs):
         """ Execute implied command, return results object
 
         Parameters
         ----------
-        None
+        **kwargs : keyword arguments
+            options for execution, passed to ``self._execute``.  Runs with
+            options bypass ``self.result_cache`` and ``self.manifest``
 
         Returns
         -------
@@ -75,12 +176,172 @@ class AppWrapper(object):
             results object instance, as returned from output of command after
             processing with ``self.result_maker``
         """
-        cmdstr = self.parameter_definitions.make_cmdline(
-            self.cmd,
-            self._positionals,
-            self._options,
-            checked=True)
-        return self.result_maker(*self._execute(cmdstr))
+        start = perf_counter()
+        cmdline = self.cmdline()
+        timings = {'check': self._check_time,
+                   'render': perf_counter() - start}
+        if kwargs:
+            return self._make_result(cmdline,
+                                     self._execute(cmdline, **kwargs),
+                                     timings)
+        manifest = self.manifest
+        if manifest is None:
+            return self._cached_run(cmdline, timings)
+        inputs, outputs = self.input_files(), self.output_files()
+        if manifest.is_current(cmdline, inputs, outputs):
+            return self._up_to_date_result()
+        result = self._cached_run(cmdline, timings)
+        if getattr(result, 'result_code', 0) == 0:
+            manifest.record(cmdline, inputs, outputs)
+        return result
+
+    def _cached_run(self, cmdline, timings):
+        """ Execute `cmdline` or get result from ``self.result_cache`` """
+        cache = self.result_cache
+        if cache is None:
+            return self._make_result(cmdline, self._execute(cmdline), timings)
+        try:
+            key = cache.key(cmdline, self.input_files())
+        except OSError: # Missing input files; let the command deal with that
+            return self._make_result(cmdline, self._execute(cmdline), timings)
+        result = None
+        # A stored result does not make missing output files
+        if all(os.path.exists(path) for path in self.output_files()):
+            result = cache.get(key)
+        if result is None:
+            result = self._make_result(cmdline, self._execute(cmdline),
+                                       timings)
+            if getattr(result, 'result_code', 0) == 0:
+                cache.set(key, result)
+        return result
+
+    def _up_to_date_result(self):
+        """ Return result for command skipped because it is up to date
+
+        The result has result code 0, no output, and attribute ``up_to_date``
+        set to True.
+        """
+        result = self.result_maker(0, BytesIO(), BytesIO())
+        result.up_to_date = True
+        return result
+
+    def run_many(self, param_sets, max_workers=None, ordered=False,
+                 pin_cpus=False, **kwargs):
+        """ Execute command for each of `param_sets`, generating results
+
+        Each parameter set is checked and rendered on its own, independently
+        of the positionals and options set on this instance.  At most
+        `max_workers` commands run at any one time.
+
+        Parameters
+        ----------
+        param_sets : iterable
+            iterable of ``(positionals, named)`` pairs, as for
+            ``set_parameters``
+        max_workers : None or int or limit object, optional
+            maximum number of commands running at once.  If None, use the
+            number of CPUs.  Can also be an object with attributes
+            ``limit`` and ``max_workers`` and method ``job_done``, such as
+            :class:`caller.adaptive.AdaptiveLimit`, to adjust the number of
+            commands as commands finish.
+        ordered : {False, True}, optional
+            If False, yield results as each command finishes.  If True, yield
+            results in the order of `param_sets`
+        pin_cpus : {False, True}, optional
+            If True, split the CPUs this process can use into `max_workers`
+            slices, and run each command with CPU affinity set to a slice
+            that no other running command is using.  Needs the
+            ``cpu_affinity`` option of ``_execute``.
+        **kwargs : keyword arguments
+            options for execution, passed to ``self._execute`` for each
+            command
+
+        Returns
+        -------
+        res_gen : generator
+            generator yielding results objects, as for ``run``
+        """
+        limiter = None
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        elif hasattr(max_workers, 'job_done'):
+            limiter, max_workers = max_workers, max_workers.max_workers
+        if max_workers < 1:
+            raise ValueError('max_workers should be >= 1')
+        pdefs = self.parameter_definitions
+        param_sets = iter(param_sets)
+        jobs = deque()
+        running = set()
+        job_info = {}
+        free_slices = deque(_cpu_slices(max_workers) if pin_cpus else ())
+        with futures.ThreadPoolExecutor(max_workers) as executor:
+            while True:
+                # Top up to limit of commands in flight
+                limit = max_workers if limiter is None else limiter.limit
+                while len(running) < limit:
+                    try:
+                        positionals, named = next(param_sets)
+                    except StopIteration:
+                        break
+                    start = perf_counter()
+                    cmdline = pdefs.make_cmdline(self.cmd, positionals, named)
+                    timings = {'render': perf_counter() - start}
+                    cpus = None
+                    if pin_cpus:
+                        cpus = free_slices.popleft()
+                        kwargs['cpu_affinity'] = cpus
+                    job = executor.submit(self._execute, cmdline, **kwargs)
+                    job_info[job] = (cmdline, timings, cpus)
+                    running.add(job)
+                    jobs.append(job)
+                if not jobs:
+                    break
+                done, running = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED)
+                if pin_cpus:
+                    free_slices.extend(job_info[job][2] for job in done)
+                if limiter is not None:
+                    for job in done:
+                        limiter.job_done()
+                if ordered:
+                    while jobs and jobs[0].done():
+                        job = jobs.popleft()
+                        cmdline, timings, _ = job_info.pop(job)
+                        yield self._make_result(cmdline, job.result(), timings)
+                    continue
+                for job in done:
+                    jobs.remove(job)
+                    cmdline, timings, _ = job_info.pop(job)
+                    yield self._make_result(cmdline, job.result(), timings)
+
+    def _make_result(self, cmdline, outputs, timings=None):
+        """ Make result from outputs of ``_execute``, report metrics
+
+        Parameters
+        ----------
+        cmdline : tuple
+            command line that was executed
+        outputs : sequence
+            arguments to ``self.result_maker``, as returned from ``_execute``
+        timings : None or dict, optional
+            timings of phases before execution, added to result ``timings``
+
+        Returns
+        -------
+        res_obj : object
+            results object instance from ``self.result_maker``
+        """
+        result = self.result_maker(*outputs)
+        result_timings = getattr(result, 'timings', None)
+        if timings and result_timings is not None:
+            result_timings.update(timings)
+        if _metrics_hooks:
+            metrics = {'result_code': getattr(result, 'result_code', None),
+                       'timings': result_timings,
+                       'rusage': getattr(result, 'rusage', None)}
+            for hook in list(_metrics_hooks):
+                hook(self, cmdline, metrics)
+        return result
 
     def _execute(self, cmd):
         """ Raw execute of command `cmd`
@@ -93,27 +354,858 @@ class AppWrapper(object):
 
 
 class ShellResult(object):
-    """ Package results of running a system command line """
+    """ Package results of running a system command line
+
+    ``stdout`` and ``stderr`` are file-like objects.  For a command still
+    running, such as a command run with streaming capture, ``result_code`` is
+    None until you call ``wait()``.
+
+    ``timings`` is a dict of seconds spent in each phase of the run (see
+    ``add_metrics_hook``), and ``rusage`` is the resource usage of the
+    command from ``os.wait4``, or None if not available.  ``up_to_date`` is
+    True for results of commands that did not run because their outputs were
+    up to date (see ``AppWrapper.manifest``).
+    """
+    up_to_date = False
+
     def __init__(self,
                  result_code,
                  stdout,
-                 stdin):
+                 stderr,
+                 waiter=None,
+                 timings=None,
+                 rusage=None):
         self.result_code = result_code
         self.stdout = stdout
-        self.stdin = stdin
+        self.stderr = stderr
         self.fields = {}
+        self._waiter = waiter
+        if timings is None:
+            timings = {}
+        self.timings = timings
+        self.rusage = rusage
+
+    @property
+    def stdin(self):
+        """ Old name for ``stderr`` attribute """
+        return self.stderr
+
+    def wait(self):
+        """ Wait for command to finish, return result code
+
+        Any unread output from a streaming ``stdout`` is discarded.
+        """
+        if self._waiter is not None:
+            self.result_code, self.rusage = self._waiter()
+            self._waiter = None
+        return self.result_code
+
+
+class _Reaping(object):
+    """ Mixin to reap child process with ``os.wait4``, recording ``rusage``
+
+    ``wait`` and ``poll`` reap the child with ``os.wait4`` directly, rather
+    than through ``subprocess`` internals, so ``rusage`` is set however the
+    child is reaped.  Reaping holds ``reap_lock``, so another thread holding
+    the lock, and seeing ``returncode`` is None, can signal the child knowing
+    its process ID has not passed to another process.  A blocking ``wait``
+    waits for the child to exit before taking the lock.
+    """
+    rusage = None
+
+    if hasattr(os, 'wait4'):
+        def poll(self):
+            return self._reap(os.WNOHANG)
+
+        def wait(self, timeout=None):
+            if timeout is None and hasattr(os, 'waitid'):
+                if self.returncode is None:
+                    try:
+                        # Wait for exit, leaving the child to reap
+                        os.waitid(os.P_PID, self.pid,
+                                  os.WEXITED | os.WNOWAIT)
+                    except ChildProcessError:
+                        pass
+                return self._reap(0)
+            end = None if timeout is None else perf_counter() + timeout
+            while self._reap(os.WNOHANG) is None:
+                delay = 0.005
+                if end is not None:
+                    remaining = end - perf_counter()
+                    if remaining <= 0:
+                        raise subprocess.TimeoutExpired(self.args, timeout)
+                    delay = min(remaining, delay)
+                sleep(delay)
+            return self.returncode
+
+        def _reap(self, flags):
+            with self.reap_lock:
+                if self.returncode is not None:
+                    return self.returncode
+                try:
+                    pid, status, rusage = os.wait4(self.pid, flags)
+                except ChildProcessError:
+                    # Reaped elsewhere; as for ``subprocess``, assume success
+                    pid, status, rusage = self.pid, 0, None
+                if pid == self.pid:
+                    self.rusage = rusage
+                    self.returncode = _exit_code(status)
+                return self.returncode
+
+
+class _Popen(_Reaping, subprocess.Popen):
+    """ Popen recording resource usage of child process when reaping it
+    """
+    def __init__(self, *args, **kwargs):
+        self.reap_lock = threading.RLock()
+        super(_Popen, self).__init__(*args, **kwargs)
+
+
+def _exit_code(status):
+    """ Return ``Popen`` style return code from ``os.wait`` `status` """
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+# Signals that Python ignores, to restore to default in child processes, as
+# ``subprocess`` does
+_DEFAULT_SIGNALS = tuple(getattr(signal, name)
+                         for name in ('SIGPIPE', 'SIGXFZ', 'SIGXFSZ')
+                         if hasattr(signal, name))
+
+
+class _SpawnedProcess(_Reaping):
+    """ Child process started with ``os.posix_spawnp``
+
+    Unlike ``fork``, ``posix_spawn`` does not copy the page tables of the
+    parent, so starting a child from a large parent is fast.  The class
+    implements the parts of the ``subprocess.Popen`` interface that
+    ``ShellWrapper`` uses, for a child with pipes for ``stdout`` and
+    ``stderr``.
+    """
+    def __init__(self, cmd, stdin=None, new_session=False):
+        self.args = cmd = list(cmd)
+        self.reap_lock = threading.RLock()
+        out_read, out_write = os.pipe()
+        err_read, err_write = os.pipe()
+        # The pipe file descriptors are not inheritable, so the child only
+        # gets the duplicates
+        file_actions = [(os.POSIX_SPAWN_DUP2, out_write, 1),
+                        (os.POSIX_SPAWN_DUP2, err_write, 2)]
+        parent_fds, child_fds = [out_read, err_read], [out_write, err_write]
+        if stdin == subprocess.PIPE:
+            in_read, in_write = os.pipe()
+            file_actions.append((os.POSIX_SPAWN_DUP2, in_read, 0))
+            parent_fds.append(in_write)
+            child_fds.append(in_read)
+        elif stdin is not None:
+            file_actions.append((os.POSIX_SPAWN_DUP2, stdin, 0))
+        try:
+            self.pid = os.posix_spawnp(cmd[0], cmd, os.environ,
+                                       file_actions=file_actions,
+                                       setsigdef=_DEFAULT_SIGNALS,
+                                       setsid=new_session)
+        except BaseException:
+            for fd in parent_fds:
+                os.close(fd)
+            raise
+        finally:
+            for fd in child_fds:
+                os.close(fd)
+        self.stdin = None
+        if stdin == subprocess.PIPE:
+            self.stdin = open(in_write, 'wb')
+        self.stdout = open(out_read, 'rb')
+        self.stderr = open(err_read, 'rb')
+        self.returncode = None
+
+    def kill(self):
+        with self.reap_lock:
+            if self.returncode is None:
+                try:
+                    os.kill(self.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def communicate(self):
+        err = []
+        thread = threading.Thread(
+            target=lambda: err.append(self.stderr.read()))
+        thread.daemon = True
+        thread.start()
+        out = self.stdout.read()
+        self.stdout.close()
+        thread.join()
+        self.stderr.close()
+        self.wait()
+        return out, err[0]
+
+
+def _cpu_slices(n_slices):
+    """ Split CPUs available to this process into `n_slices` lists
+
+    If there are fewer CPUs than slices, slices share CPUs.
+    """
+    if hasattr(os, 'sched_getaffinity'):
+        cpus = sorted(os.sched_getaffinity(0))
+    else:
+        cpus = list(range(os.cpu_count() or 1))
+    n_cpus = len(cpus)
+    if n_slices >= n_cpus:
+        return [[cpus[i % n_cpus]] for i in range(n_slices)]
+    return [cpus[i * n_cpus // n_slices:(i + 1) * n_cpus // n_slices]
+            for i in range(n_slices)]
+
+
+def _resource_limits(rlimits):
+    """ Return list of (resource, (soft, hard)) for `rlimits` mapping
+
+    See ``ShellWrapper`` for `rlimits`.
+    """
+    if resource is None:
+        raise ValueError('Resource limits not supported on this platform')
+    limits = []
+    for key, value in rlimits.items():
+        if isinstance(key, str):
+            name = key.upper()
+            if not name.startswith('RLIMIT_'):
+                name = 'RLIMIT_' + name
+            try:
+                key = getattr(resource, name)
+            except AttributeError:
+                raise ValueError('Unknown resource limit "%s"' % name)
+        if isinstance(value, int):
+            value = (value, resource.getrlimit(key)[1])
+        soft, hard = value
+        if hard != resource.RLIM_INFINITY and not 0 <= soft <= hard:
+            raise ValueError('Soft limit %s above hard limit %s' %
+                             (soft, hard))
+        limits.append((key, (soft, hard)))
+    return limits
+
+
+def _limits_args(rlimits=None, nice=None, cpu_affinity=None):
+    """ Return ``execlimits`` options to set limits for command, or None
+
+    Values are checked here, before starting the command.
+    """
+    if not rlimits and not nice and cpu_affinity is None:
+        return None
+    args = ['--rlimit=%d:%d:%d' % (key, soft, hard)
+            for key, (soft, hard) in _resource_limits(rlimits or {})]
+    if nice:
+        args.append('--nice=%d' % nice)
+    if cpu_affinity is not None:
+        if not hasattr(os, 'sched_setaffinity'):
+            raise ValueError('CPU affinity not supported on this platform')
+        cpus = sorted(set(cpu_affinity))
+        if not cpus:
+            raise ValueError('Need at least one CPU for cpu_affinity')
+        args.append('--cpus=' + ','.join('%d' % cpu for cpu in cpus))
+    return args
+
+
+def _limited_command(cmd, shell, limits_args):
+    """ Return command running `cmd` through ``execlimits``
+
+    The returned command runs without the shell.  Raises ``OSError`` for a
+    command that does not exist, as ``subprocess.Popen`` does.
+    """
+    cmd = [cmd] if isinstance(cmd, str) else list(cmd)
+    if shell:
+        cmd = ['/bin/sh', '-c'] + cmd
+    elif shutil.which(cmd[0]) is None:
+        raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT),
+                                cmd[0])
+    return ([sys.executable, '-I', '-S', execlimits.__file__] +
+            limits_args + ['--'] + cmd)
+
+
+class CallerTimeout(CallerError):
+    """ Error for command killed because it ran past its timeout """
+
+
+class CallerCancelled(CallerError):
+    """ Error for command killed because its run was cancelled """
+
+
+class _Watchdog(object):
+    """ Kill child process at timeout, or when `cancel` event is set
+
+    The child should have started a new session, so killing its process
+    group kills the child and any processes it started, and these cannot
+    hold the output pipes open.  The watchdog does not kill a child that
+    has been reaped.
+    """
+    # Seconds between checks of `cancel` event
+    poll_interval = 0.01
+
+    def __init__(self, child, timeout=None, cancel=None):
+        self._child = child
+        self._timeout = timeout
+        self._cancel = cancel
+        self._done = threading.Event()
+        self.reason = None
+        self._thread = threading.Thread(target=self._watch)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _watch(self):
+        start = perf_counter()
+        while True:
+            if self._cancel is not None and self._cancel.is_set():
+                reason = 'cancel'
+                break
+            wait = None
+            if self._timeout is not None:
+                wait = self._timeout - (perf_counter() - start)
+                if wait <= 0:
+                    reason = 'timeout'
+                    break
+            if self._cancel is not None:
+                wait = (self.poll_interval if wait is None
+                        else min(wait, self.poll_interval))
+            if self._done.wait(wait):
+                return
+        child = self._child
+        with child.reap_lock:
+            if child.returncode is not None:
+                # Finished in time; the process ID may now be another process
+                return
+            self.reason = reason
+            if hasattr(os, 'killpg'):
+                try:
+                    os.killpg(child.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+            else:
+                child.kill()
+
+    def finish(self):
+        """ Stop watching, raise error if watchdog killed child """
+        self._done.set()
+        self._thread.join()
+        if self.reason == 'timeout':
+            raise CallerTimeout('Command timed out after %s seconds' %
+                                self._timeout)
+        if self.reason == 'cancel':
+            raise CallerCancelled('Command cancelled')
+
+
+def _copy_pipe(pipe, sink, chunk_size=_CHUNK_SIZE):
+    """ Copy all of `pipe` into file-like `sink`, then close `pipe` """
+    try:
+        while True:
+            chunk = pipe.read(chunk_size)
+            if not chunk:
+                break
+            sink.write(chunk)
+    finally:
+        pipe.close()
+
+
+def _stdin_source(stdin):
+    """ Return child stdin, chunks to write, file descriptor to close
+
+    Parameters
+    ----------
+    stdin : None or object
+        See ``ShellWrapper._execute``
+
+    Returns
+    -------
+    child_stdin : None or int
+        None, file descriptor, or ``subprocess.PIPE``, for child stdin
+    chunks : None or iterator
+        If not None, iterator of chunks to write to child stdin pipe
+    own_fd : None or int
+        If not None, file descriptor to close after starting child
+    """
+    if stdin is None:
+        return None, None, None
+    if isinstance(stdin, bool):
+        raise TypeError('stdin should not be bool')
+    if isinstance(stdin, int):
+        return stdin, None, None
+    if isinstance(stdin, (str, os.PathLike)):
+        fd = os.open(stdin, os.O_RDONLY)
+        return fd, None, fd
+    if hasattr(stdin, 'getbuffer'): # BytesIO
+        stdin = stdin.getbuffer()
+    if isinstance(stdin, (bytes, bytearray, memoryview)):
+        view = memoryview(stdin).cast('B')
+        chunks = (view[i:i + _CHUNK_SIZE]
+                  for i in range(0, len(view), _CHUNK_SIZE))
+        return subprocess.PIPE, chunks, None
+    if hasattr(stdin, 'read'):
+        try:
+            return stdin.fileno(), None, None
+        except (OSError, ValueError, AttributeError):
+            # Also io.UnsupportedOperation; file-like without file descriptor
+            return (subprocess.PIPE,
+                    iter(lambda: stdin.read(_CHUNK_SIZE), b''),
+                    None)
+    return subprocess.PIPE, iter(stdin), None
+
+
+class _StdinFeeder(object):
+    """ Write chunks to child stdin pipe from a background thread """
+    def __init__(self, pipe, chunks):
+        self._pipe = pipe
+        self._chunks = chunks
+        self._error = None
+        self._thread = threading.Thread(target=self._feed)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _feed(self):
+        try:
+            for chunk in self._chunks:
+                self._pipe.write(chunk)
+        except BrokenPipeError: # Child did not read all input
+            pass
+        except BaseException as exc:
+            self._error = exc
+        finally:
+            try:
+                self._pipe.close()
+            except BrokenPipeError:
+                pass
+
+    def finish(self):
+        """ Wait for end of input, raise any error from getting chunks """
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+
+class _NullSink(object):
+    """ File-like sink discarding all writes """
+    def write(self, data):
+        pass
+
+
+class MappedOutput(object):
+    """ Read-only memory-mapped view of command output spilled to disk
+
+    Supports the reading methods of ``mmap`` objects (``read``, ``readline``,
+    ``seek``, ``find`` ...), as well as iteration over lines, indexing and
+    slicing.  ``getbuffer()`` and ``getvalue()`` work as for ``BytesIO``.
+
+    Examples
+    --------
+    >>> import tempfile
+    >>> fobj = tempfile.TemporaryFile()
+    >>> _ = fobj.write(b'one\\ntwo\\n')
+    >>> out = MappedOutput(fobj)
+    >>> len(out)
+    8
+    >>> out[4:7] == b'two'
+    True
+    >>> [line for line in out] == [b'one\\n', b'two\\n']
+    True
+    """
+    def __init__(self, fileobj):
+        fileobj.flush()
+        self._file = fileobj
+        self.mmap = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def getbuffer(self):
+        """ Return read-only memoryview onto output without copying """
+        return memoryview(self.mmap)
+
+    def getvalue(self):
+        """ Return all output as bytes """
+        return self.mmap[:]
+
+    def readlines(self):
+        return list(self)
+
+    def close(self):
+        self.mmap.close()
+        self._file.close()
+
+    def __len__(self):
+        return len(self.mmap)
+
+    def __getitem__(self, key):
+        return self.mmap[key]
+
+    def __iter__(self):
+        return iter(self.mmap.readline, b'')
+
+    def __getattr__(self, name):
+        return getattr(self.mmap, name)
+
+
+class _SpillBuffer(object):
+    """ Write sink holding data in memory up to `max_size` bytes, then on disk
+    """
+    def __init__(self, max_size):
+        self._max_size = max_size
+        self._file = BytesIO()
+        self._spilled = False
+
+    def write(self, data):
+        if (not self._spilled and
+            self._file.tell() + len(data) > self._max_size):
+            spill = tempfile.TemporaryFile()
+            spill.write(self._file.getbuffer())
+            self._file = spill
+            self._spilled = True
+        self._file.write(data)
+
+    def output(self):
+        """ Return ``BytesIO`` or ``MappedOutput`` reading written data """
+        if self._spilled:
+            return MappedOutput(self._file)
+        self._file.seek(0)
+        return self._file
+
+
+class _DrainedStream(object):
+    """ File-like view of a pipe drained by a background thread
+
+    Reading from the stream waits until the pipe has reached end of file.
+    The data is then in a ``BytesIO`` or, if larger than `max_size` bytes, a
+    ``MappedOutput``.
+    """
+    def __init__(self, pipe, max_size):
+        self._sink = _SpillBuffer(max_size)
+        self._output = None
+        self._thread = threading.Thread(target=_copy_pipe,
+                                        args=(pipe, self._sink))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def finish(self):
+        """ Wait for end of pipe, return file-like output """
+        if self._output is None:
+            self._thread.join()
+            self._output = self._sink.output()
+        return self._output
+
+    def __iter__(self):
+        return iter(self.finish())
+
+    def __getattr__(self, name):
+        return getattr(self.finish(), name)
 
 
 class ShellWrapper(AppWrapper):
-    """ Wrap system command line application """
+    """ Wrap system command line application
+
+    Class attributes, in addition to those of ``AppWrapper``, are:
+
+    * shell : bool - whether to run the command through the shell
+    * capture : str - how to capture output of the command.  One of:
+
+      * 'memory' - read all output into ``BytesIO`` objects
+      * 'stream' - ``stdout`` of the result is the live pipe from the
+        command, to read incrementally (or iterate over lines). ``stderr``
+        drains into a spool file in the background, so the command cannot
+        block on a full pipe.  Call ``wait()`` on the result to get the result
+        code.
+      * 'spill' - drain ``stdout`` and ``stderr`` concurrently, keeping up to
+        ``spool_size`` bytes of each in memory as ``BytesIO``.  Larger output
+        goes to a temporary file, returned as a read-only ``MappedOutput``,
+        so memory use stays bounded.
+    * spool_size : int - number of bytes of drained output to keep in memory
+      before spilling to disk.
+    * spawn : str - how to start the command process.  One of:
+
+      * 'popen' - use ``subprocess.Popen``, which forks the Python process
+      * 'posix_spawn' - use ``os.posix_spawnp`` where available, which is
+        faster for large Python processes.  Falls back to ``subprocess.Popen``
+        where ``posix_spawn`` is not available, or for options it does not
+        support, such as running through the shell.
+
+      The 'spawn' entry in the result ``timings`` gives the time taken.
+    * launcher : None or launcher object such as
+      :class:`caller.launcher.Launcher`.  If not None, run commands by
+      calling ``launcher.execute(cmd, shell)``, which returns the result
+      code, stdout and stderr bytes.  Only used for 'memory' capture, and
+      for commands without ``stdin`` input; launched commands read empty
+      input.
+
+    * timeout : None or float - seconds to wait for the command before
+      killing it, and raising ``CallerTimeout``.  None means no timeout.
+    * new_session : bool - whether to start the command in a new session
+      (and process group).  Commands run with a timeout or cancel event
+      always start in a new session, so a timeout or cancellation kills any
+      processes the command started, as well as the command, and these
+      cannot keep the output pipes open.
+    * rlimits : None or mapping - resource limits for the command.  Keys are
+      names such as 'as' (address space), 'cpu' (CPU seconds) or 'nofile'
+      (open files), or ``resource.RLIMIT_*`` constants.  Values are soft
+      limits, or (soft, hard) pairs.
+    * nice : None or int - increment to niceness of command
+    * cpu_affinity : None or iterable - CPU numbers that the command may run
+      on.
+
+      Commands with `rlimits`, `nice` or `cpu_affinity` run through
+      :mod:`caller.execlimits`, a small Python script that sets the limits,
+      then replaces itself with the command, so the limits are in place
+      before the command starts, with either spawn method.  This adds the
+      start time of the Python interpreter to the command.  Errors setting
+      the limits give result code 126.
+
+    ``run`` also accepts ``capture``, ``spawn``, ``timeout``, ``rlimits``,
+    ``nice`` and ``cpu_affinity`` to override the class attributes,
+    ``stdin`` to give input to the command, and ``cancel`` to cancel the
+    run; see ``_execute``.
+    """
     result_maker = ShellResult
     shell=False
+    capture = 'memory'
+    spool_size = 2 ** 20
+    spawn = 'popen'
+    launcher = None
+    timeout = None
+    new_session = False
+    rlimits = None
+    nice = None
+    cpu_affinity = None
 
-    def _execute(self, cmd):
-        child = subprocess.Popen(cmd,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
-                                 shell=self.shell)
-        (out, err) = child.communicate()
-        error_code = child.returncode
-        return error_code, BytesIO(out), BytesIO(err)
+    def _execute(self, cmd, capture=None, spawn=None, stdin=None,
+                 timeout=None, cancel=None, rlimits=None, nice=None,
+                 cpu_affinity=None):
+        """ Raw execute of command `cmd`
+
+        Parameters
+        ----------
+        cmd : sequence
+            command line sequence
+        capture : None or str, optional
+            capture mode.  If None, use ``self.capture``
+        spawn : None or str, optional
+            spawn method.  If None, use ``self.spawn``
+        stdin : None or object, optional
+            input for command.  One of:
+
+            * None - command inherits stdin of this process
+            * str or path-like - filename of file to connect to command stdin
+            * int (not bool), or file object with file descriptor - file
+              descriptor to connect to command stdin
+            * bytes, bytearray, memoryview or ``BytesIO`` - buffer to write
+              to command stdin
+            * other file-like object with ``read`` method, or iterable -
+              source of chunks of bytes to write to command stdin
+
+            File names and descriptors connect directly to the command.  A
+            background thread writes buffers and chunks to the command,
+            without copying buffers.
+        timeout : None or float, optional
+            seconds to wait for command.  If None, use ``self.timeout``.  A
+            command still running after `timeout` seconds is killed, and
+            raises ``CallerTimeout``; for 'stream' capture, ``wait()`` on the
+            result raises the error.
+        cancel : None or ``threading.Event``, optional
+            if not None, kill the command when `cancel` is set, and raise
+            ``CallerCancelled``, as for `timeout`.
+        rlimits : None or mapping, optional
+            resource limits.  If None, use ``self.rlimits``
+        nice : None or int, optional
+            niceness increment.  If None, use ``self.nice``
+        cpu_affinity : None or iterable, optional
+            CPUs to run on.  If None, use ``self.cpu_affinity``
+        """
+        if capture is None:
+            capture = self.capture
+        if capture not in ('memory', 'stream', 'spill'):
+            raise ValueError('Unknown capture mode "%s"' % capture)
+        if spawn is None:
+            spawn = self.spawn
+        if spawn not in ('popen', 'posix_spawn'):
+            raise ValueError('Unknown spawn method "%s"' % spawn)
+        if timeout is None:
+            timeout = self.timeout
+        limits_args = _limits_args(
+            self.rlimits if rlimits is None else rlimits,
+            self.nice if nice is None else nice,
+            self.cpu_affinity if cpu_affinity is None else cpu_affinity)
+        if cancel is not None and cancel.is_set():
+            raise CallerCancelled('Command cancelled before start')
+        start = perf_counter()
+        if (self.launcher is not None and capture == 'memory' and
+            stdin is None and timeout is None and cancel is None and
+            limits_args is None):
+            error_code, out, err = self.launcher.execute(cmd, self.shell)
+            timings = {'wait': perf_counter() - start}
+            return error_code, BytesIO(out), BytesIO(err), None, timings, None
+        shell = self.shell
+        if limits_args is not None:
+            cmd = _limited_command(cmd, shell, limits_args)
+            shell = False
+        watched = timeout is not None or cancel is not None
+        child_stdin, chunks, own_fd = _stdin_source(stdin)
+        try:
+            # Watched commands need their own process group to kill
+            child = self._spawn(cmd, spawn, child_stdin,
+                                self.new_session or watched, shell)
+        finally:
+            if own_fd is not None:
+                os.close(own_fd)
+        watchdog = None
+        if watched:
+            watchdog = _Watchdog(child, timeout, cancel)
+        feeder = None
+        if chunks is not None:
+            # Take pipe from child, so ``communicate`` does not close it
+            feeder = _StdinFeeder(child.stdin, chunks)
+            child.stdin = None
+        timings = {'spawn': perf_counter() - start}
+        start = perf_counter()
+        if capture == 'memory':
+            (out, err) = child.communicate()
+            error_code = child.returncode
+            if watchdog is not None:
+                watchdog.finish()
+            if feeder is not None:
+                feeder.finish()
+            timings['wait'] = perf_counter() - start
+            return (error_code, BytesIO(out), BytesIO(err), None, timings,
+                    child.rusage)
+        stderr = _DrainedStream(child.stderr, self.spool_size)
+        if capture == 'spill':
+            stdout = _DrainedStream(child.stdout, self.spool_size)
+            out, err = stdout.finish(), stderr.finish()
+            error_code = child.wait()
+            if watchdog is not None:
+                watchdog.finish()
+            if feeder is not None:
+                feeder.finish()
+            timings['wait'] = perf_counter() - start
+            return error_code, out, err, None, timings, child.rusage
+        stdout = child.stdout
+
+        def waiter():
+            if not stdout.closed:
+                _copy_pipe(stdout, _NullSink())
+            stderr.finish()
+            error_code = child.wait()
+            if watchdog is not None:
+                watchdog.finish()
+            if feeder is not None:
+                feeder.finish()
+            timings['wait'] = perf_counter() - start
+            return error_code, child.rusage
+
+        return None, stdout, stderr, waiter, timings, None
+
+    def __or__(self, other):
+        return ShellPipe((self,)) | other
+
+    def _spawn(self, cmd, spawn, stdin=None, new_session=False, shell=None):
+        """ Start and return process for `cmd`, with stdout, stderr pipes
+
+        `stdin` is None, a file descriptor, or ``subprocess.PIPE``.  If
+        `new_session` is True, start `cmd` in a new session.  If `shell` is
+        None, use ``self.shell``.
+        """
+        if shell is None:
+            shell = self.shell
+        if (spawn == 'posix_spawn' and
+            hasattr(os, 'posix_spawnp') and
+            not shell):
+            return _SpawnedProcess(cmd, stdin, new_session)
+        return _Popen(cmd,
+                      stdin=stdin,
+                      start_new_session=new_session,
+                      stdout=subprocess.PIPE,
+                      stderr=subprocess.PIPE,
+                      shell=shell)
+
+
+class PipeResult(ShellResult):
+    """ Package results of running a pipe of system commands
+
+    As for a shell pipe, ``result_code`` and ``stderr`` are the result code
+    and stderr of the last command.  ``result_codes`` and ``stderrs`` are
+    lists with the result codes and stderr for every command in the pipe.
+    ``rusages`` is a list of resource usage for each command.
+    """
+    def __init__(self, result_codes, stdout, stderrs, timings=None,
+                 rusages=None):
+        rusage = rusages[-1] if rusages else None
+        super(PipeResult, self).__init__(result_codes[-1],
+                                         stdout,
+                                         stderrs[-1],
+                                         timings=timings,
+                                         rusage=rusage)
+        self.result_codes = result_codes
+        self.stderrs = stderrs
+        self.rusages = rusages
+
+
+class ShellPipe(object):
+    """ Shell wrappers with stdout of each connected to stdin of the next
+
+    Make pipes with ``|``.  Running the pipe connects the commands with
+    operating system pipes, so output passes directly between commands.  All
+    ``stderr`` and the final ``stdout`` drain concurrently, as for 'spill'
+    capture with the ``spool_size`` of the last wrapper.
+
+    Examples
+    --------
+    >>> import sys
+    >>> from caller import ParameterDefinitions, Positional
+    >>> class Echo(ShellWrapper):
+    ...     cmd = 'echo'
+    ...     parameter_definitions = ParameterDefinitions((Positional('word'),))
+    >>> class Upper(ShellWrapper):
+    ...     cmd = (sys.executable, '-c',
+    ...            'import sys; sys.stdout.write(sys.stdin.read().upper())')
+    ...     parameter_definitions = ParameterDefinitions(())
+    >>> res = (Echo(('hello',)) | Upper()).run()
+    >>> res.result_codes, res.stdout.getvalue() == b'HELLO\\n'
+    ([0, 0], True)
+    """
+    def __init__(self, wrappers):
+        self.wrappers = tuple(wrappers)
+
+    def __or__(self, other):
+        if isinstance(other, ShellPipe):
+            return ShellPipe(self.wrappers + other.wrappers)
+        if isinstance(other, ShellWrapper):
+            return ShellPipe(self.wrappers + (other,))
+        return NotImplemented
+
+    def run(self):
+        """ Run commands connected by pipes, return ``PipeResult`` """
+        cmdlines = [wrapper.cmdline() for wrapper in self.wrappers]
+        start = perf_counter()
+        children = []
+        stdin = None
+        try:
+            for wrapper, cmdline in zip(self.wrappers, cmdlines):
+                child = _Popen(cmdline,
+                               stdin=stdin,
+                               stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE,
+                               shell=wrapper.shell)
+                children.append(child)
+                if stdin is not None:
+                    # Only the next command should hold the read end
+                    stdin.close()
+                stdin = child.stdout
+        except BaseException:
+            for child in children:
+                child.kill()
+                child.wait()
+                child.stdout.close()
+                child.stderr.close()
+            raise
+        timings = {'spawn': perf_counter() - start}
+        start = perf_counter()
+        spool_size = self.wrappers[-1].spool_size
+        stderrs = [_DrainedStream(child.stderr, spool_size)
+                   for child in children]
+        stdout = _DrainedStream(children[-1].stdout, spool_size)
+        result_codes = [child.wait() for child in children]
+        stdout = stdout.finish()
+        stderrs = [stderr.finish() for stderr in stderrs]
+        timings['wait'] = perf_counter() - start
+        return PipeResult(result_codes, stdout, stderrs, timings,
+                          [child.rusage for child in children])
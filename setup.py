@@ -9,5 +9,5 @@ setup(name='caller',
       author='Matthew Brett',
       author_email='matthew.brett@gmail.com',
       url='None',
-      packages=['caller', 'caller.tests', 'biocaller'],
+      packages=['caller', 'caller.tests', 'caller.benchmarks', 'biocaller'],
       )